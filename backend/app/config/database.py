@@ -1,37 +1,306 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
+from ..utils.metrics import TimedQueuePool, instrument_engine, register_pool_gauges
+from ..utils.profiler import slow_query_profiler
 
 load_dotenv()
 
+
+def _async_url(url: str) -> str:
+    # Convert postgresql:// to postgresql+asyncpg:// for async support
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+    # Remove incompatible query parameters for asyncpg
+    # asyncpg doesn't support sslmode or channel_binding in URL
+    if "?" in url:
+        base_url, params = url.split("?", 1)
+        # Keep only ssl parameter, remove sslmode and channel_binding
+        if "ssl=" in params or "sslmode=" in params:
+            url = base_url
+    return url
+
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not found in environment variable")
+DATABASE_URL = _async_url(DATABASE_URL)
 
-# Convert postgresql:// to postgresql+asyncpg:// for async support
-if DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-
-# Remove incompatible query parameters for asyncpg
-# asyncpg doesn't support sslmode or channel_binding in URL
-if "?" in DATABASE_URL:
-    base_url, params = DATABASE_URL.split("?", 1)
-    # Keep only ssl parameter, remove sslmode and channel_binding
-    if "ssl=" in params or "sslmode=" in params:
-        DATABASE_URL = base_url
-
-# Create engine with SSL configuration
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    connect_args={"ssl": "require"},  # SSL configuration for asyncpg
-)
+# Optional read replica for analytics and exports (unset = primary only)
+ANALYTICS_DATABASE_URL = os.getenv("ANALYTICS_DATABASE_URL")
+if ANALYTICS_DATABASE_URL:
+    ANALYTICS_DATABASE_URL = _async_url(ANALYTICS_DATABASE_URL)
+
+# Engine profile: "dev" logs SQL with a small pool, "prod" is quiet and
+# sized for a hosted Postgres. Every setting can be overridden individually.
+DB_PROFILE = os.getenv("DB_PROFILE", "dev").lower()
+if DB_PROFILE not in ("dev", "prod"):
+    raise ValueError(f"DB_PROFILE must be 'dev' or 'prod', got {DB_PROFILE!r}")
+
+_PROFILE_DEFAULTS = {
+    "dev": {
+        "echo": "true",
+        "pool_size": "5",
+        "max_overflow": "10",
+        "pool_timeout": "30",
+        "pool_recycle": "-1",
+        "pool_pre_ping": "false",
+    },
+    "prod": {
+        "echo": "false",
+        "pool_size": "20",
+        "max_overflow": "10",
+        "pool_timeout": "10",
+        "pool_recycle": "1800",
+        "pool_pre_ping": "true",
+    },
+}[DB_PROFILE]
+
+
+def _setting(name: str) -> str:
+    return os.getenv(f"DB_{name.upper()}", _PROFILE_DEFAULTS[name])
+
+
+DB_ECHO = _setting("echo").lower() == "true"
+DB_POOL_SIZE = int(_setting("pool_size"))
+DB_MAX_OVERFLOW = int(_setting("max_overflow"))
+DB_POOL_TIMEOUT = float(_setting("pool_timeout"))
+DB_POOL_RECYCLE = int(_setting("pool_recycle"))
+DB_POOL_PRE_PING = _setting("pool_pre_ping").lower() == "true"
+
+# asyncpg specific: prepared statement cache (0 when behind pgbouncer),
+# server side statement timeout and SSL mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_SSL = os.getenv("DB_SSL", "require")
+
+# Replica reads fall back to the primary when it lags more than this,
+# or is unreachable; lag is re-checked at most every ANALYTICS_LAG_CHECK_S
+ANALYTICS_MAX_LAG_S = float(os.getenv("ANALYTICS_MAX_LAG_S", "30"))
+ANALYTICS_LAG_CHECK_S = float(os.getenv("ANALYTICS_LAG_CHECK_S", "5"))
+
+
+def _connect_args(url: str) -> dict:
+    if not url.startswith("postgresql+asyncpg://"):
+        return {}
+    connect_args = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    if DB_SSL != "disable":
+        connect_args["ssl"] = DB_SSL  # SSL configuration for asyncpg
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["server_settings"] = {
+            "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+        }
+    return connect_args
+
+
+def _engine_url(url: str):
+    if not url.startswith("postgresql+asyncpg://"):
+        return url
+    # SQLAlchemy's own cache of asyncpg prepared statements
+    return make_url(url).update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+
+
+def _engine_options(url: str) -> dict:
+    return {
+        "echo": DB_ECHO,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": _connect_args(url),
+        # Queue pool that also times checkouts (SQLite gets the same pool as Postgres)
+        "poolclass": TimedQueuePool,
+    }
+
+
+engine = create_async_engine(_engine_url(DATABASE_URL), **_engine_options(DATABASE_URL))
+instrument_engine(engine)
+slow_query_profiler.install(engine)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
+read_engine: AsyncEngine | None = None
+if ANALYTICS_DATABASE_URL:
+    read_engine = create_async_engine(
+        _engine_url(ANALYTICS_DATABASE_URL), **_engine_options(ANALYTICS_DATABASE_URL)
+    )
+    instrument_engine(read_engine)
+    slow_query_profiler.install(read_engine)
+
+# PostgreSQL standby lag in seconds (0 on a primary, or when fully replayed)
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class ReplicaStatus:
+    """Whether analytics reads may use the replica, re-checked periodically."""
+
+    def __init__(self, max_lag_s: float, check_interval_s: float):
+        self.max_lag_s = max_lag_s
+        self.check_interval_s = check_interval_s
+        self.lag_s: float | None = None
+        self.error: str | None = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    @property
+    def usable(self) -> bool:
+        return self.error is None and self.lag_s is not None and self.lag_s <= self.max_lag_s
+
+    async def check(self) -> bool:
+        if read_engine is None:
+            return False
+        if time.monotonic() - self._checked_at < self.check_interval_s:
+            return self.usable
+        async with self._lock:
+            # Another request refreshed it while we waited
+            if time.monotonic() - self._checked_at < self.check_interval_s:
+                return self.usable
+            was_usable, previous_error = self.usable, self.error
+            try:
+                async with read_engine.connect() as conn:
+                    if conn.dialect.name == "postgresql":
+                        self.lag_s = float((await conn.execute(_REPLICA_LAG_SQL)).scalar())
+                    else:
+                        await conn.execute(text("SELECT 1"))
+                        self.lag_s = 0.0
+                self.error = None
+            except Exception as exc:
+                self.error = repr(exc)
+            self._checked_at = time.monotonic()
+            if (was_usable and not self.usable) or (
+                self.error and self.error != previous_error
+            ):
+                print(
+                    f"⚠️  Analytics replica unusable (lag={self.lag_s}s, "
+                    f"error={self.error}), reading from primary"
+                )
+            elif self.usable and not was_usable:
+                print(f"✅ Analytics reads on replica (lag={self.lag_s}s)")
+            return self.usable
+
+    def stats(self) -> dict:
+        return {
+            "configured": read_engine is not None,
+            "usable": self.usable,
+            "lag_s": self.lag_s,
+            "max_lag_s": self.max_lag_s,
+            # Public endpoint: the exception text can carry DSN details, it
+            # goes to the server log only
+            "error": "unreachable" if self.error else None,
+        }
+
+
+replica_status = ReplicaStatus(ANALYTICS_MAX_LAG_S, ANALYTICS_LAG_CHECK_S)
+
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
         await session.commit()
+
+
+async def get_read_engine() -> AsyncEngine:
+    """Replica engine when configured and caught up, else the primary."""
+    if read_engine is not None and await replica_status.check():
+        return read_engine
+    return engine
+
+
+async def get_read_db():
+    """Read-only session: replica when usable, else primary.
+
+    For routes that query within the request. /track/analytics and
+    /track/export take get_read_engine instead: their work outlives the
+    request session (shared computations, streamed bodies).
+    """
+    async with AsyncSessionLocal(bind=await get_read_engine()) as session:
+        yield session
+
+
+def add_missing_columns(sync_conn) -> list:
+    """Add nullable columns declared on a model but missing from its table.
+
+    ``ALTER TABLE ... ADD COLUMN`` without a default only touches the catalog
+    (existing rows read NULL), so this is cheap even on big tables. Returns
+    the added columns as "table.column".
+    """
+    inspector = inspect(sync_conn)
+    preparer = sync_conn.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            sync_conn.execute(
+                text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+            )
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def ensure_schema(sync_conn) -> None:
+    """Create missing tables, columns and indexes added to existing tables.
+
+    ``create_all`` only builds indexes together with a new table, so indexes
+    declared later on a model are created here (plain CREATE INDEX, which
+    locks writes; use ``python manage.py create-indexes`` on big tables).
+    """
+    Base.metadata.create_all(sync_conn)
+    for column in add_missing_columns(sync_conn):
+        print(f"🧱 Added column {column}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def dialect_insert(dialect_name: str, table):
+    """INSERT construct that supports ON CONFLICT for the given dialect."""
+    if dialect_name == "sqlite":
+        return sqlite_insert(table)
+    return pg_insert(table)
+
+
+def pool_stats() -> dict:
+    """Connection pool counters for the pool-stats endpoint."""
+    pool = engine.pool
+    stats = {
+        "profile": DB_PROFILE,
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    if read_engine is not None:
+        read_pool = read_engine.pool
+        stats["replica"] = {
+            "checked_in": read_pool.checkedin(),
+            "checked_out": read_pool.checkedout(),
+            "overflow": read_pool.overflow(),
+        }
+    return stats
+
+
+register_pool_gauges(pool_stats)
@@ -0,0 +1,13 @@
+from ..config.database import Base
+from sqlalchemy import Column, Integer, String, Date
+
+
+# Daily pre-aggregated click counts, analytics isi table se padhta hai
+class DailyClickRollup(Base):
+    __tablename__ = "feature_click_daily"
+
+    day = Column(Date, primary_key=True)  # UTC day of the click
+    feature_name = Column(String, primary_key=True)
+    age_bucket = Column(String, primary_key=True)  # "<18", "18-40", ">40"
+    gender = Column(String, primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,10 @@
+from ..config.database import Base
+from sqlalchemy import Column, Integer, String
+
+
+# Feature names ki dimension table, clicks sirf chhota integer id store karte hai
+class Feature(Base):
+    __tablename__ = "features"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)  # e.g. "date_filter"
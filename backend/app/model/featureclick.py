@@ -1,19 +1,73 @@
 from ..config.database import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Uuid
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Uuid, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
+from dotenv import load_dotenv
+from .feature import Feature  # noqa: F401  (features table must exist for the FK)
+import os
 import uuid
 
+load_dotenv()
+
+# Optional BRIN index on timestamp: tiny and cheap to maintain for
+# append-only click data, useful once the table is very large
+CLICKS_BRIN_INDEX = os.getenv("CLICKS_BRIN_INDEX", "false").lower() == "true"
+
+# Monthly RANGE partitioning on timestamp (PostgreSQL). Partitions are
+# managed by app/utils/partitions.py; convert an existing table with
+# `python manage.py partition-clicks`.
+CLICKS_PARTITIONED = os.getenv("CLICKS_PARTITIONED", "false").lower() == "true"
+
+
+def _click_table_args():
+    indexes = [
+        # Analytics: timestamp range filter + GROUP BY feature; user_id and
+        # the demographic filters are INCLUDEd so every dashboard query can
+        # run as an index-only scan of this table alone
+        Index(
+            "ix_feature_clicks_timestamp_feature_demographics",
+            "timestamp",
+            "feature_id",
+            postgresql_include=["user_id", "age_bucket", "gender"],
+        ),
+        # Per-user lookups and the FK side of the user join
+        Index("ix_feature_clicks_user_id", "user_id"),
+    ]
+    if CLICKS_BRIN_INDEX:
+        indexes.append(
+            Index(
+                "ix_feature_clicks_timestamp_brin",
+                "timestamp",
+                postgresql_using="brin",
+            )
+        )
+    if CLICKS_PARTITIONED:
+        return (*indexes, {"postgresql_partition_by": "RANGE (timestamp)"})
+    return tuple(indexes)
+
 
 class FeatureClick(Base):
     __tablename__ = "feature_clicks"
+    __table_args__ = _click_table_args()
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("user.id"), nullable=False)
-    feature_name = Column(String, nullable=False)  # e.g. "date_filter"
+    # Native 16-byte UUIDs on Postgres; values stay plain strings in Python
+    id = Column(Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(Uuid(as_uuid=False), ForeignKey("user.id"), nullable=False)
+    # Partitioned tables need the partition key inside the primary key
     timestamp = Column(
-        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        primary_key=CLICKS_PARTITIONED,
+        nullable=not CLICKS_PARTITIONED,
     )
+    # features.id of the clicked feature, e.g. "date_filter" -> 1
+    feature_id = Column(Integer, ForeignKey("features.id"), nullable=False)
+    # The user's age group ("<18", "18-40", ">40") and gender at click time,
+    # so analytics can filter without joining user. NULL only on rows older
+    # than these columns, until `python manage.py backfill-click-demographics`.
+    age_bucket = Column(String)
+    gender = Column(String)
 
     # Relationship back to user
     user = relationship("User", back_populates="clicks")
+    feature = relationship("Feature")
@@ -0,0 +1,14 @@
+from ..config.database import Base
+from sqlalchemy import Column, String, Date, LargeBinary
+
+
+# Har (day, feature, age bucket, gender) ke unique users ka HyperLogLog sketch,
+# date range ke unique users inko merge karke nikalte hain
+class DailyUserSketch(Base):
+    __tablename__ = "feature_user_sketch_daily"
+
+    day = Column(Date, primary_key=True)  # UTC day of the clicks
+    feature_name = Column(String, primary_key=True)
+    age_bucket = Column(String, primary_key=True)  # "<18", "18-40", ">40"
+    gender = Column(String, primary_key=True)
+    sketch = Column(LargeBinary, nullable=False)  # app.utils.hll serialized
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, status
+from ..schema.user import CurrentUser
+from ..utils.auth import get_admin_user
+from ..utils.profiler import slow_query_profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(admin: CurrentUser = Depends(get_admin_user)):
+    """Slow statements captured by this worker, newest first, with sampled plans."""
+    return {
+        "enabled": slow_query_profiler.enabled,
+        "threshold_ms": slow_query_profiler.threshold * 1000,
+        "explain_rate": slow_query_profiler.explain_rate,
+        "queries": slow_query_profiler.snapshot(),
+    }
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries(admin: CurrentUser = Depends(get_admin_user)):
+    slow_query_profiler.clear()
@@ -1,104 +1,173 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from datetime import datetime, date
-from sqlalchemy import func, cast, Date, select
-from ..config.database import get_db, AsyncSession
-from ..model.featureclick import FeatureClick
-from ..model.user import User as UserModel
-from ..schema.featureclick import ClickCreate, ClickOut
-from ..utils.auth import get_current_user
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncEngine
+from ..config.database import get_db, get_read_engine, AsyncSession
+from ..schema.user import CurrentUser
+from ..schema.featureclick import ClickCreate, ClickOut, ClickBatch, ClickBatchOut
+from ..utils.analytics import compute_analytics, GRANULARITIES
+from ..utils.auth import get_admin_user, get_current_user, get_current_user_stream
+from ..utils.export import EXPORT_FORMATS, export_limiter, stream_clicks
+from ..utils.ingest import (
+    INGEST_MAX_CLICK_AGE_S, click_buffer, click_row, write_clicks, BufferFull
+)
+from ..utils.live import stream_events
+from ..utils.responses import ReleasingStreamingResponse, conditional_json
 
 router = APIRouter(prefix="/track", tags=["tracks"])
 
 
+def _click_timestamp(client_ts: datetime | None, now: datetime) -> datetime | None:
+    """Normalize a client supplied timestamp (naive = UTC, never in the future).
+
+    None when it is older than INGEST_MAX_CLICK_AGE_S: such clicks would land
+    in days that are already cached, rolled up or archived.
+    """
+    if client_ts is None:
+        return now
+    if client_ts.tzinfo is None:
+        client_ts = client_ts.replace(tzinfo=timezone.utc)
+    if client_ts < now - timedelta(seconds=INGEST_MAX_CLICK_AGE_S):
+        return None
+    return min(client_ts, now)
+
+
+def _parse_date_range(start_date: str, end_date: str) -> tuple[date, date]:
+    """Parse startDate/endDate query values (YYYY-MM-DD) or raise 400."""
+    try:
+        s_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        e_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format. Expected YYYY-MM-DD",
+        )
+    return s_date, e_date
+
+
 @router.get("/analytics")
 async def get_analytics(
+    request: Request,
     start_date: str = Query(..., alias="startDate"),
     end_date: str = Query(..., alias="endDate"),
     age_group: str | None = Query(None, alias="ageGroup"),
     gender: str | None = Query(None),
-    db: AsyncSession = Depends(get_db),
-    create_user: UserModel = Depends(get_current_user),
+    granularity: str = Query("day"),
+    read_engine: AsyncEngine = Depends(get_read_engine),
+    create_user: CurrentUser = Depends(get_current_user),
 ):
-    """Get analytics data for feature clicks."""
-    # Manual Parsing to be robust against frontend formats
-    from datetime import datetime, date, timedelta
-
-    # ... imports ...
+    """Get analytics data for feature clicks (ETag / 304, br or gzip).
 
+    Shed with 503 + Retry-After when too many analytics queries are queued.
+    """
     # Manual Parsing to be robust against frontend formats
-    try:
-        s_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-        e_date = datetime.strptime(end_date, "%Y-%m-%d").date()
-    except ValueError:
+    s_date, e_date = _parse_date_range(start_date, end_date)
+
+    if granularity not in GRANULARITIES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid date format. Expected YYYY-MM-DD",
+            detail=f"Invalid granularity. Expected one of {', '.join(GRANULARITIES)}",
         )
 
-    # Build filters (Inclusive of the End Date up to 23:59:59.999)
-    # Convert dates to datetime to ensure robust comparison with TIMESTAMP columns
-    # IMPORTANT: We assume the input Date is effectively "Local Date".
-    # Since we can't solve all Timezone issues without user input, we expand the range slightly.
-    # But for now, we make it simple: 00:00 to 23:59 inclusive.
-    start_dt = datetime.combine(s_date, datetime.min.time())
-    end_dt = datetime.combine(e_date, datetime.max.time())
-
-    # Ensure timestamp comparison is robust
-    filters = [FeatureClick.timestamp >= start_dt, FeatureClick.timestamp <= end_dt]
-
-    if age_group == "<18":
-        filters.append(UserModel.age < 18)
-    elif age_group == "18-40":
-        filters.append(UserModel.age.between(18, 40))
-    elif age_group == ">40":
-        filters.append(UserModel.age > 40)
-
-    if gender:
-        filters.append(UserModel.gender == gender)
-
-    # Bar chart: clicks per feature
-    bar_query = (
-        select(FeatureClick.feature_name, func.count(FeatureClick.id))
-        .join(UserModel)
-        .where(*filters)
-        .group_by(FeatureClick.feature_name)
+    encoded = await compute_analytics(
+        read_engine, s_date, e_date, age_group, gender, granularity
     )
+    return conditional_json(request, encoded)
+
 
-    # Line chart: clicks per day per feature
-    line_query = (
-        select(
-            cast(FeatureClick.timestamp, Date),
-            FeatureClick.feature_name,
-            func.count(FeatureClick.id),
+@router.get("/export")
+async def export_clicks(
+    start_date: str = Query(..., alias="startDate"),
+    end_date: str = Query(..., alias="endDate"),
+    age_group: str | None = Query(None, alias="ageGroup"),
+    gender: str | None = Query(None),
+    export_format: str = Query("csv", alias="format"),
+    read_engine: AsyncEngine = Depends(get_read_engine),
+    admin: CurrentUser = Depends(get_admin_user),
+):
+    """Stream raw click events with click-time demographics as CSV or NDJSON.
+
+    Admins only (ADMIN_USERNAMES): rows carry every user's id, age and gender.
+    A limiter slot is held until the body is sent; when none is free the
+    request gets 503 with Retry-After.
+    """
+    s_date, e_date = _parse_date_range(start_date, end_date)
+
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format. Expected one of {', '.join(EXPORT_FORMATS)}",
         )
-        .join(UserModel)
-        .where(*filters)
-        .group_by(cast(FeatureClick.timestamp, Date), FeatureClick.feature_name)
+
+    filename = f"clicks_{s_date}_{e_date}.{export_format}"
+    release = await export_limiter.acquire()
+    return ReleasingStreamingResponse(
+        stream_clicks(read_engine, s_date, e_date, age_group, gender, export_format),
+        release=release,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
-    bar_result = await db.execute(bar_query)
-    line_result = await db.execute(line_query)
 
-    return {
-        "bar_data": [{"feature": row[0], "clicks": row[1]} for row in bar_result.all()],
-        "line_data": [
-            {"date": str(row[0]), "feature": row[1], "clicks": row[2]}
-            for row in line_result.all()
-        ],
-    }
+@router.get("/stream")
+async def stream_clicks_live(
+    age_group: str | None = Query(None, alias="ageGroup"),
+    gender: str | None = Query(None),
+    current_user: CurrentUser = Depends(get_current_user_stream),
+):
+    """Server-Sent Events feed of click count deltas for live dashboards."""
+    return StreamingResponse(
+        stream_events(age_group, gender),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=ClickOut)
+@router.post("/", status_code=status.HTTP_202_ACCEPTED, response_model=ClickOut)
 async def create_track(
     request: ClickCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    """Create a new feature click tracking event."""
-    new_click = FeatureClick(user_id=current_user.id, feature_name=request.feature_name)
+    """Accept a feature click; it is written by the write-behind buffer."""
+    row = click_row(current_user, request.feature_name, datetime.now(timezone.utc))
 
-    db.add(new_click)
-    await db.commit()
-    await db.refresh(new_click)
+    if not click_buffer.running:
+        # Buffer not started (scripts, tests): write synchronously
+        await write_clicks(db, [row])
+        return row
 
-    return new_click
+    try:
+        click_buffer.submit(row)
+    except BufferFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Click ingestion is busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    return row
+
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED, response_model=ClickBatchOut)
+async def create_track_batch(
+    request: ClickBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """Create many feature click events with a single multi-row INSERT.
+
+    Events with a stale client timestamp are dropped (``inserted`` < ``received``).
+    """
+    now = datetime.now(timezone.utc)
+    timestamps = [_click_timestamp(event.timestamp, now) for event in request.events]
+    rows = [
+        click_row(current_user, event.feature_name, timestamp)
+        for event, timestamp in zip(request.events, timestamps)
+        if timestamp is not None
+    ]
+
+    # One statement, no refresh: counts are enough for the client
+    await write_clicks(db, rows)
+
+    return {"received": len(request.events), "inserted": len(rows)}
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from ..utils.auth import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
     verify_access_token,
     create_access_token,
 )
@@ -38,7 +38,7 @@ async def create_user(request: UserCreate, db: AsyncSession = Depends(get_db)):
                 )
 
         # Hash password and create new user
-        hashed_pwd = get_password_hash(request.password)
+        hashed_pwd = await get_password_hash_async(request.password)
         new_user = UserModel(
             username=request.username,
             email=request.email,
@@ -73,7 +73,9 @@ async def login(request: UserLogin, db: AsyncSession = Depends(get_db)):
         user = result.scalars().first()
 
         # Verify user exists and password is correct
-        if not user or not verify_password(request.password, user.password):
+        if not user or not await verify_password_async(
+            request.password, user.password
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid username or password",
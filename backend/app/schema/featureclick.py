@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from datetime import datetime
+from typing import List, Optional
+
+# Ek batch mein maximum kitne events aa sakte hain
+MAX_BATCH_EVENTS = 500
 
 
 # Feature tracking ke liye schema
@@ -16,3 +20,18 @@ class ClickOut(ClickCreate):
 
     class Config:
         from_attributes = True
+
+
+# Batch ingestion: ek event, client apna timestamp bhej sakta hai
+class ClickEvent(ClickCreate):
+    timestamp: Optional[datetime] = None
+
+
+class ClickBatch(BaseModel):
+    events: List[ClickEvent] = Field(..., min_length=1, max_length=MAX_BATCH_EVENTS)
+
+
+# Batch response: rows dobara read nahi karte, sirf counts
+class ClickBatchOut(BaseModel):
+    received: int
+    inserted: int
@@ -25,6 +25,17 @@ class UserOut(User):
         from_attributes = True
 
 
+# Authenticated principal: sirf wahi fields jo routes ko chahiye (cached)
+class CurrentUser(BaseModel):
+    id: str
+    username: str
+    age: int
+    gender: str
+
+    class Config:
+        from_attributes = True
+
+
 # Login
 class UserLogin(BaseModel):
     username: str
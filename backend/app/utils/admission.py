@@ -0,0 +1,157 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from fastapi import HTTPException, status
+from .metrics import ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS, REQUESTS_COALESCED
+
+
+class ConcurrencyLimiter:
+    """Caps how many expensive requests of one kind run at once.
+
+    Up to ``limit`` callers hold a slot; the next ``max_queue`` wait for one
+    in arrival order. Anyone beyond that, or still waiting after
+    ``max_wait_s``, gets 503 with Retry-After, so a stampede is shed before
+    it can take every pooled connection from ingest and auth.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        max_wait_s: float,
+        retry_after_s: int,
+    ):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.retry_after_s = retry_after_s
+        self._waiters: deque = deque()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(limiter=self.name, reason=reason)
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Too many {self.name} requests, retry shortly",
+            headers={"Retry-After": str(self.retry_after_s)},
+        )
+
+    async def _acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait_s)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up
+                self._release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject("timeout")
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+            ADMISSION_WAIT_SECONDS.observe(waited, limiter=self.name)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest waiter, if any
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def acquire(self) -> Callable[[], None]:
+        """Take one slot, or raise 503, for work that outlives the caller
+        (e.g. a streamed body). Returns the release function; extra calls
+        to it are no-ops."""
+        await self._acquire()
+        self.admitted += 1
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release()
+
+        return release
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot for the block, or raise 503."""
+        release = await self.acquire()
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait_s,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds, 6),
+        }
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key
+    await the call already in flight instead of starting their own.
+
+    The call runs as its own task, so a caller that disconnects does not
+    cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            REQUESTS_COALESCED.inc(flight=self.name)
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller went away
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,609 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable
+from dotenv import load_dotenv
+from sqlalchemy import func, cast, distinct, tuple_, Date, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from ..config.database import (
+    DB_POOL_SIZE,
+    AsyncSessionLocal,
+    read_engine,
+    replica_status,
+)
+from ..model.clickrollup import DailyClickRollup
+from ..model.featureclick import FeatureClick
+from .admission import ConcurrencyLimiter, SingleFlight
+from .archive import ArchiveSlice, click_archive
+from .buckets import bucket_end
+from .cache import TTLCache
+from .demographics import AGE_BUCKETS
+from .features import feature_registry
+from .hottier import hot_tier
+from .responses import EncodedJSON
+from .uniques import sketch_unique_users
+
+# Line chart bucket sizes accepted by /track/analytics
+GRANULARITIES = ("hour", "day", "week", "month")
+
+
+# Load environment variables
+load_dotenv()
+
+# Serve analytics from the daily rollup (enable after `python manage.py backfill-rollup`)
+ANALYTICS_USE_ROLLUP = os.getenv("ANALYTICS_USE_ROLLUP", "false").lower() == "true"
+
+# Unique users from the daily HyperLogLog sketches instead of COUNT(DISTINCT)
+# (enable after `python manage.py backfill-sketches`)
+ANALYTICS_USE_SKETCHES = os.getenv("ANALYTICS_USE_SKETCHES", "false").lower() == "true"
+
+# Result cache shared by identical dashboard views in this process
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_TTL_S = float(os.getenv("ANALYTICS_CACHE_TTL_S", "30"))
+
+analytics_cache = TTLCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL_S)
+
+# Admission control: analytics queries running at once per process (default:
+# half the pool, leaving the rest to ingest and auth), how many may queue and
+# for how long before the request is shed with 503 + Retry-After
+ANALYTICS_MAX_CONCURRENCY = int(os.getenv("ANALYTICS_MAX_CONCURRENCY", "0")) or max(
+    1, DB_POOL_SIZE // 2
+)
+ANALYTICS_MAX_QUEUE = int(os.getenv("ANALYTICS_MAX_QUEUE", "32"))
+ANALYTICS_QUEUE_TIMEOUT_S = float(os.getenv("ANALYTICS_QUEUE_TIMEOUT_S", "5"))
+ANALYTICS_RETRY_AFTER_S = int(os.getenv("ANALYTICS_RETRY_AFTER_S", "2"))
+
+analytics_limiter = ConcurrencyLimiter(
+    "analytics",
+    ANALYTICS_MAX_CONCURRENCY,
+    ANALYTICS_MAX_QUEUE,
+    ANALYTICS_QUEUE_TIMEOUT_S,
+    ANALYTICS_RETRY_AFTER_S,
+)
+# Identical dashboard views computed once while the first is still running
+analytics_flights = SingleFlight("analytics")
+
+# Bumped on every invalidation so a query that raced a write is not cached
+_cache_generation = 0
+
+
+def cache_key(
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str = "day",
+) -> tuple:
+    """Normalized cache key; unknown age groups mean "no age filter"."""
+    if age_group not in AGE_BUCKETS:
+        age_group = None
+    return (s_date, e_date, age_group, gender or None, granularity)
+
+
+def _cache_ttl(db: AsyncSession) -> float:
+    """Cache lifetime for a result read through ``db``.
+
+    A replica result is already up to ``lag_s`` old, so it is kept only
+    until it would be ANALYTICS_MAX_LAG_S old (0 = do not cache).
+    """
+    if read_engine is None or db.bind is not read_engine:
+        return ANALYTICS_CACHE_TTL_S
+    remaining = replica_status.max_lag_s - (replica_status.lag_s or 0.0)
+    return max(0.0, min(ANALYTICS_CACHE_TTL_S, remaining))
+
+
+def invalidate_analytics(click_days: Iterable[date]) -> int:
+    """Drop cached results whose date range covers any of the given days.
+
+    Ranges are widened by a day on each side because the raw query buckets
+    by the database session's local date while ingest knows the UTC date.
+    """
+    global _cache_generation
+    days = set(click_days)
+    if not days:
+        return 0
+    _cache_generation += 1
+    slack = timedelta(days=1)
+    return analytics_cache.invalidate(
+        lambda key: any(key[0] - slack <= day <= key[1] + slack for day in days)
+    )
+
+
+def _rollup_aligned(age_group: str | None, granularity: str) -> bool:
+    """The rollup answers a query only if its filters match bucket boundaries.
+
+    Dates are whole days by construction; the age filter must be one of the
+    rollup's age buckets (or absent) and the series cannot be finer than a day.
+    """
+    if granularity == "hour":
+        return False
+    return not age_group or age_group in AGE_BUCKETS
+
+
+def bucket_expr(column, granularity: str, dialect_name: str):
+    """SQL expression truncating a timestamp/date column to the bucket start."""
+    if dialect_name == "sqlite":
+        return {
+            "hour": func.strftime("%Y-%m-%d %H:00:00", column),
+            "day": func.date(column),
+            "week": func.date(column, "weekday 0", "-6 days"),  # Monday
+            "month": func.strftime("%Y-%m-01", column),
+        }[granularity]
+    if granularity == "hour":
+        return func.date_trunc("hour", column)
+    if granularity == "day":
+        return cast(column, Date)
+    return cast(func.date_trunc(granularity, column), Date)
+
+
+def _bucket_label(value, granularity: str) -> str:
+    if granularity == "hour":
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value.strftime("%Y-%m-%dT%H:00")
+    return str(value)[:10]
+
+
+def _series_result(rows, granularity: str) -> Dict[str, Any]:
+    """Build bar and line data from (bucket, feature, clicks) rows.
+
+    Per-feature totals are summed from the series, so the table is scanned
+    only once per request.
+    """
+    totals: Dict[str, int] = {}
+    line_data = []
+    for bucket, feature, clicks in rows:
+        clicks = int(clicks)
+        totals[feature] = totals.get(feature, 0) + clicks
+        line_data.append(
+            {
+                "date": _bucket_label(bucket, granularity),
+                "feature": feature,
+                "clicks": clicks,
+            }
+        )
+    return {
+        "bar_data": [
+            {"feature": feature, "clicks": clicks} for feature, clicks in totals.items()
+        ],
+        "line_data": line_data,
+    }
+
+
+def click_filters(
+    s_date: date, e_date: date, age_group: str | None, gender: str | None
+) -> list:
+    """WHERE clauses over FeatureClick for the dashboard filters.
+
+    Age group and gender are stored on each click, so no join to user is
+    needed; unknown age groups mean "no age filter".
+    """
+    # Build filters (Inclusive of the End Date up to 23:59:59.999)
+    # Convert dates to datetime to ensure robust comparison with TIMESTAMP columns
+    # IMPORTANT: We assume the input Date is effectively "Local Date".
+    # Since we can't solve all Timezone issues without user input, we expand the range slightly.
+    # But for now, we make it simple: 00:00 to 23:59 inclusive.
+    start_dt = datetime.combine(s_date, datetime.min.time())
+    end_dt = datetime.combine(e_date, datetime.max.time())
+
+    # Ensure timestamp comparison is robust
+    filters = [FeatureClick.timestamp >= start_dt, FeatureClick.timestamp <= end_dt]
+
+    if age_group in AGE_BUCKETS:
+        filters.append(FeatureClick.age_bucket == age_group)
+
+    if gender:
+        filters.append(FeatureClick.gender == gender)
+
+    return filters
+
+
+async def _raw_series(
+    db: AsyncSession,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+    users: bool = False,
+) -> list:
+    """(bucket, feature id, clicks) rows from feature_clicks, buckets in order;
+    with ``users`` each row also carries its distinct users."""
+    filters = click_filters(s_date, e_date, age_group, gender)
+
+    # Single pass: clicks per bucket per feature (bar totals derived from it),
+    # grouped by the integer feature id and named from the in-memory map
+    bucket = bucket_expr(
+        FeatureClick.timestamp, granularity, db.get_bind().dialect.name
+    )
+    columns = [bucket, FeatureClick.feature_id, func.count()]
+    if users:
+        columns.append(func.count(distinct(FeatureClick.user_id)))
+    series_query = (
+        select(*columns)
+        .where(*filters)
+        .group_by(bucket, FeatureClick.feature_id)
+        .order_by(bucket)
+    )
+
+    result = await db.execute(series_query)
+    return result.all()
+
+
+async def _raw_series_and_users(
+    db: AsyncSession,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+) -> tuple[list, list]:
+    """(bucket, feature id, clicks, users) rows, buckets in order, and
+    (feature id, users) over the whole range.
+
+    PostgreSQL gets both groupings from one scan with GROUPING SETS; SQLite
+    has no grouping sets, so there the totals take a second query.
+    """
+    dialect_name = db.get_bind().dialect.name
+    users = func.count(distinct(FeatureClick.user_id))
+    filters = click_filters(s_date, e_date, age_group, gender)
+    if dialect_name != "postgresql":
+        series_rows = await _raw_series(
+            db, s_date, e_date, age_group, gender, granularity, users=True
+        )
+        result = await db.execute(
+            select(FeatureClick.feature_id, users)
+            .where(*filters)
+            .group_by(FeatureClick.feature_id)
+        )
+        return series_rows, result.all()
+
+    bucket = bucket_expr(FeatureClick.timestamp, granularity, dialect_name)
+    result = await db.execute(
+        select(bucket, FeatureClick.feature_id, func.count(), users, func.grouping(bucket))
+        .where(*filters)
+        .group_by(
+            func.grouping_sets(
+                tuple_(bucket, FeatureClick.feature_id), tuple_(FeatureClick.feature_id)
+            )
+        )
+        .order_by(bucket)
+    )
+    series_rows, totals_rows = [], []
+    for value, feature_id, clicks, count, is_total in result.all():
+        if is_total:
+            totals_rows.append((feature_id, count))
+        else:
+            series_rows.append((value, feature_id, clicks, count))
+    return series_rows, totals_rows
+
+
+async def _raw_analytics(
+    db: AsyncSession,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+    users: bool,
+) -> Dict[str, Any]:
+    """Bar and line data from feature_clicks; with ``users`` also exact
+    unique users (``unique_users``), counted in the same pass."""
+    if not users:
+        rows = await _raw_series(db, s_date, e_date, age_group, gender, granularity)
+        names = await feature_registry.names({feature_id for _, feature_id, _ in rows})
+        return _series_result(
+            [(bucket, names[feature_id], clicks) for bucket, feature_id, clicks in rows],
+            granularity,
+        )
+
+    series_rows, totals_rows = await _raw_series_and_users(
+        db, s_date, e_date, age_group, gender, granularity
+    )
+    names = await feature_registry.names({feature_id for feature_id, _ in totals_rows})
+    result = _series_result(
+        [(bucket, names[feature_id], clicks) for bucket, feature_id, clicks, _ in series_rows],
+        granularity,
+    )
+    result["unique_users"] = _unique_users_result(
+        [(bucket, feature_id, count) for bucket, feature_id, _, count in series_rows],
+        totals_rows,
+        names,
+        granularity,
+    )
+    return result
+
+
+def _unique_users_result(series_rows, totals_rows, names, granularity: str) -> Dict[str, Any]:
+    """Exact unique users in the shape of sketch_unique_users, from
+    (bucket, feature id, users) and (feature id, users) rows."""
+    return {
+        "exact": True,
+        "relative_error": 0.0,
+        "totals": [
+            {"feature": names[feature_id], "users": count, "margin": 0}
+            for feature_id, count in totals_rows
+        ],
+        "series": [
+            {
+                "date": _bucket_label(value, granularity),
+                "feature": names[feature_id],
+                "users": count,
+                "margin": 0,
+            }
+            for value, feature_id, count in series_rows
+        ],
+    }
+
+
+async def _hot_analytics(
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+) -> Dict[str, Any]:
+    """Bar, line and exact unique users from the in-memory hot tier."""
+    aggregated = hot_tier.aggregate(s_date, e_date, age_group, gender, granularity)
+    names = await feature_registry.names(
+        {feature_id for _, feature_id, _, _ in aggregated["series"]}
+    )
+    result = _series_result(
+        [
+            (bucket, names[feature_id], clicks)
+            for bucket, feature_id, clicks, _ in aggregated["series"]
+        ],
+        granularity,
+    )
+    result["unique_users"] = _unique_users_result(
+        [(bucket, feature_id, users) for bucket, feature_id, _, users in aggregated["series"]],
+        aggregated["totals"].items(),
+        names,
+        granularity,
+    )
+    return result
+
+
+async def _archive_analytics(
+    db: AsyncSession,
+    archived: ArchiveSlice,
+    boundary: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+    users: bool,
+) -> Dict[str, Any]:
+    """Bar and line data (with ``users`` also exact unique users) for a range
+    starting before the archive boundary: archived days from the archive
+    slice, the rest from feature_clicks."""
+    live_rows = []
+    if e_date >= boundary:
+        live_rows = await _raw_series(
+            db, boundary, e_date, age_group, gender, granularity, users=users
+        )
+
+    clicks: Dict[tuple, int] = {}
+    for key, feature_id, count in archived.click_counts():
+        label = _bucket_label(archived.bucket_value(key), granularity)
+        clicks[(label, feature_id)] = count
+    # A week or month bucket can span the boundary: sum both sides
+    for bucket, feature_id, count, *_ in live_rows:
+        label = _bucket_label(bucket, granularity)
+        clicks[(label, feature_id)] = clicks.get((label, feature_id), 0) + count
+
+    names = await feature_registry.names({feature_id for _, feature_id in clicks})
+    result = _series_result(
+        [(label, names[feature_id], count) for (label, feature_id), count in sorted(clicks.items())],
+        granularity,
+    )
+    if users:
+        result["unique_users"] = await _archive_unique_users(
+            db, archived, boundary, e_date, age_group, gender, granularity, live_rows
+        )
+    return result
+
+
+async def _archive_unique_users(
+    db: AsyncSession,
+    archived: ArchiveSlice,
+    boundary: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+    live_rows: list,
+) -> Dict[str, Any]:
+    """Exact unique users for a range starting before the archive boundary.
+
+    Users of the totals, and of a week or month bucket spanning the
+    boundary, are the union of both sides: the live side's distinct
+    (feature, user) pairs are fetched for those and merged into the archive
+    slice. Buckets entirely after the boundary come from ``live_rows``
+    (bucket, feature id, clicks, users).
+    """
+    live = e_date >= boundary
+
+    async def live_pairs(last_day: date) -> list:
+        result = await db.execute(
+            select(FeatureClick.feature_id, FeatureClick.user_id)
+            .where(*click_filters(boundary, last_day, age_group, gender))
+            .distinct()
+        )
+        rows = result.all()
+        codes = click_archive.user_codes([user_id for _, user_id in rows])
+        return [(feature_id, code) for (feature_id, _), code in zip(rows, codes)]
+
+    split_pairs = []
+    if live and granularity in ("week", "month"):
+        split_start = date.fromordinal(archived.bucket_key(boundary))
+        if split_start < boundary:
+            split_end = min(e_date, bucket_end(split_start, granularity))
+            split_pairs = [
+                (split_start.toordinal(), feature_id, code)
+                for feature_id, code in await live_pairs(split_end)
+            ]
+    series = {
+        (_bucket_label(archived.bucket_value(key), granularity), feature_id): users
+        for (key, feature_id), users in archived.unique_users(split_pairs).items()
+    }
+    totals = archived.unique_users_by_feature(await live_pairs(e_date) if live else ())
+
+    # Buckets entirely after the boundary; the split one is already merged
+    for value, feature_id, _, users in live_rows:
+        series.setdefault((_bucket_label(value, granularity), feature_id), users)
+
+    names = await feature_registry.names(set(totals))
+    return _unique_users_result(
+        [(label, feature_id, users) for (label, feature_id), users in sorted(series.items())],
+        totals.items(),
+        names,
+        granularity,
+    )
+
+
+async def _rollup_analytics(
+    db: AsyncSession,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+) -> Dict[str, Any]:
+    filters = [DailyClickRollup.day >= s_date, DailyClickRollup.day <= e_date]
+    if age_group:
+        filters.append(DailyClickRollup.age_bucket == age_group)
+    if gender:
+        filters.append(DailyClickRollup.gender == gender)
+
+    if granularity == "day":
+        bucket = DailyClickRollup.day
+    else:
+        bucket = bucket_expr(
+            DailyClickRollup.day, granularity, db.get_bind().dialect.name
+        )
+    series_query = (
+        select(bucket, DailyClickRollup.feature_name, func.sum(DailyClickRollup.clicks))
+        .where(*filters)
+        .group_by(bucket, DailyClickRollup.feature_name)
+        .order_by(bucket)
+    )
+
+    result = await db.execute(series_query)
+    return _series_result(result.all(), granularity)
+
+
+async def compute_analytics(
+    read_engine: AsyncEngine,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str = "day",
+) -> EncodedJSON:
+    """Bar (clicks per feature) and line (clicks per bucket per feature) data,
+    plus unique users per feature (``unique_users``).
+
+    Results are cached already serialized, so a cache hit costs no encoding
+    and its ETag is ready for conditional requests. Misses with the same key
+    share one computation, which waits for an analytics_limiter slot (503
+    when the queue is full). Only computations started since the last
+    invalidation are shared, so a refetch after a write never gets older data.
+    """
+    key = cache_key(s_date, e_date, age_group, gender, granularity)
+    cached = analytics_cache.get(key)
+    if cached is not None:
+        return cached
+
+    generation = _cache_generation
+
+    async def compute() -> EncodedJSON:
+        async with analytics_limiter.slot():
+            # Not a request session: the request that started this may go away first
+            async with AsyncSessionLocal(bind=read_engine) as session:
+                return await _compute_analytics(
+                    session,
+                    key,
+                    generation,
+                    s_date,
+                    e_date,
+                    age_group,
+                    gender,
+                    granularity,
+                )
+
+    return await analytics_flights.run((key, generation), compute)
+
+
+async def _compute_analytics(
+    db: AsyncSession,
+    key: tuple,
+    generation: int,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+) -> EncodedJSON:
+    # Daily sketches cannot answer hourly buckets
+    use_sketches = ANALYTICS_USE_SKETCHES and granularity != "hour"
+    # Without sketches, exact unique users need a raw scan, and that same
+    # pass counts the clicks, so the rollup would only add a query
+    use_rollup = (
+        ANALYTICS_USE_ROLLUP and use_sketches and _rollup_aligned(age_group, granularity)
+    )
+
+    # Days before the boundary were moved to the archive files; the rollup
+    # and sketches keep them, so the archive is read only for raw queries
+    boundary = click_archive.boundary()
+    crosses_archive = boundary is not None and s_date < boundary
+    archived = None
+    if crosses_archive and not use_rollup:
+        archived = await asyncio.to_thread(
+            click_archive.load,
+            s_date,
+            min(e_date, boundary - timedelta(days=1)),
+            age_group,
+            gender,
+            granularity,
+        )
+
+    if not crosses_archive and hot_tier.covers(s_date, granularity):
+        # Recent range: answered from memory, no database round trip
+        encoded = EncodedJSON(
+            await _hot_analytics(s_date, e_date, age_group, gender, granularity)
+        )
+        if generation == _cache_generation:
+            analytics_cache.set(key, encoded)
+        return encoded
+
+    if use_rollup:
+        result = await _rollup_analytics(
+            db, s_date, e_date, age_group, gender, granularity
+        )
+    elif archived is not None:
+        result = await _archive_analytics(
+            db,
+            archived,
+            boundary,
+            e_date,
+            age_group,
+            gender,
+            granularity,
+            users=not use_sketches,
+        )
+    else:
+        result = await _raw_analytics(
+            db, s_date, e_date, age_group, gender, granularity, users=not use_sketches
+        )
+
+    if use_sketches:
+        result["unique_users"] = await sketch_unique_users(
+            db, s_date, e_date, age_group, gender, granularity
+        )
+
+    encoded = EncodedJSON(result)
+    ttl = _cache_ttl(db)
+    if generation == _cache_generation and ttl > 0:
+        analytics_cache.set(key, encoded, ttl)
+    return encoded
@@ -0,0 +1,439 @@
+import json
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from ..model.featureclick import FeatureClick
+from ..model.user import User as UserModel
+from .buckets import bucket_start
+from .demographics import AGE_BUCKETS, age_bucket_expr
+from .rollup import utc_start
+
+
+# Load environment variables
+load_dotenv()
+
+# Cold storage for old clicks: one compressed file per UTC day
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# `manage.py archive-clicks` moves clicks older than this many days (0 = off)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+# Rows deleted from feature_clicks per statement after a day is written
+ARCHIVE_DELETE_BATCH = 1000
+
+_MICROS_PER_HOUR = 3_600_000_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ArchiveSlice:
+    """Archived clicks of a date range, filtered, as NumPy columns.
+
+    One row per (bucket, feature, user) group with its click count; bucket
+    keys are day ordinals of the bucket start, or hours since the epoch for
+    hourly buckets. User codes come from the archive's user table.
+    """
+
+    def __init__(self, granularity: str, bucket, feature, user, clicks):
+        self.granularity = granularity
+        self.bucket = bucket
+        self.feature = feature
+        self.user = user
+        self.clicks = clicks
+
+    def bucket_value(self, key: int):
+        if self.granularity == "hour":
+            return _EPOCH + timedelta(hours=key)
+        return date.fromordinal(key)
+
+    def bucket_key(self, day: date) -> int:
+        """Key of the (non-hourly) bucket containing ``day``."""
+        return bucket_start(day, self.granularity).toordinal()
+
+    def click_counts(self) -> List[Tuple[int, int, int]]:
+        """(bucket key, feature id, clicks), buckets in order."""
+        if not len(self.bucket):
+            return []
+        cells, inverse = np.unique(
+            np.stack([self.bucket, self.feature], axis=1), axis=0, return_inverse=True
+        )
+        clicks = np.bincount(inverse.ravel(), weights=self.clicks)
+        return [
+            (int(key), int(feature_id), int(count))
+            for (key, feature_id), count in zip(cells.tolist(), clicks.tolist())
+        ]
+
+    def unique_users(self, extra: Iterable[Tuple[int, int, int]] = ()) -> Dict[tuple, int]:
+        """Distinct users per (bucket key, feature id), unioned with extra
+        (bucket key, feature id, user code) rows, e.g. from the live table."""
+        rows = np.stack([self.bucket, self.feature, self.user], axis=1)
+        extra = np.array(list(extra), dtype=np.int64).reshape(-1, 3)
+        rows = np.unique(np.concatenate([rows, extra]), axis=0)
+        cells, users = np.unique(rows[:, :2], axis=0, return_counts=True)
+        return {
+            (int(key), int(feature_id)): int(count)
+            for (key, feature_id), count in zip(cells.tolist(), users.tolist())
+        }
+
+    def unique_users_by_feature(self, extra: Iterable[Tuple[int, int]] = ()) -> Dict[int, int]:
+        """Distinct users per feature id over the whole slice, unioned with
+        extra (feature id, user code) rows."""
+        rows = np.stack([self.feature, self.user], axis=1)
+        extra = np.array(list(extra), dtype=np.int64).reshape(-1, 2)
+        rows = np.unique(np.concatenate([rows, extra]), axis=0)
+        features, users = np.unique(rows[:, 0], return_counts=True)
+        return dict(zip(features.tolist(), users.tolist()))
+
+
+class ClickArchive:
+    """Daily click files under ``root`` for days moved out of feature_clicks.
+
+    Layout::
+
+        manifest.json              {"through": last archived UTC day, "genders": [...]}
+        users.npy                  user ids; files refer to users by index
+        clicks/YYYY/YYYY-MM-DD.npz raw clicks + daily aggregates
+
+    Each day file holds the raw clicks (id, timestamp, feature, age bucket,
+    gender, user) and a precomputed daily aggregate: click count per
+    distinct (feature, age bucket, gender, user). Day, week and month
+    queries read only the aggregate. Every click before the day after
+    ``through`` (the boundary) is in the archive, so analytics reads days
+    before the boundary from here and the rest from the database.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._manifest_mtime: float | None = None
+        self._through: date | None = None
+        self._genders: List[str] = []
+        self._user_ids: List[str] = []
+        self._user_codes: Dict[str, int] = {}
+
+    def _reset(self) -> None:
+        self._manifest_mtime = None
+        self._through = None
+        self._genders, self._user_ids, self._user_codes = [], [], {}
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _day_path(self, day: date) -> str:
+        return self._path("clicks", str(day.year), f"{day.isoformat()}.npz")
+
+    def _refresh(self) -> None:
+        """Re-read the manifest and user table if the archive job changed them."""
+        try:
+            mtime = os.stat(self._path("manifest.json")).st_mtime
+        except FileNotFoundError:
+            self._reset()
+            return
+        if mtime == self._manifest_mtime:
+            return
+        with open(self._path("manifest.json")) as f:
+            manifest = json.load(f)
+        self._through = date.fromisoformat(manifest["through"])
+        self._genders = manifest["genders"]
+        self._user_ids = np.load(self._path("users.npy")).tolist()
+        self._user_codes = {user_id: code for code, user_id in enumerate(self._user_ids)}
+        self._manifest_mtime = mtime
+
+    def boundary(self) -> date | None:
+        """First UTC day not archived (None when the archive is empty)."""
+        self._refresh()
+        if self._through is None:
+            return None
+        return self._through + timedelta(days=1)
+
+    def user_codes(self, user_ids: Iterable[str]) -> List[int]:
+        """Archive codes for user ids; ids never archived get fresh codes
+        (consistent within one call only)."""
+        unknown: Dict[str, int] = {}
+        codes = []
+        for user_id in user_ids:
+            code = self._user_codes.get(user_id)
+            if code is None:
+                code = unknown.setdefault(
+                    user_id, len(self._user_codes) + len(unknown)
+                )
+            codes.append(code)
+        return codes
+
+    def load(
+        self,
+        first_day: date,
+        last_day: date,
+        age_group: str | None,
+        gender: str | None,
+        granularity: str,
+    ) -> ArchiveSlice:
+        """Archived clicks between two days (inclusive), filtered like the
+        dashboard. Blocking file I/O: call it in a thread."""
+        self._refresh()
+        age_code = AGE_BUCKETS.index(age_group) if age_group in AGE_BUCKETS else None
+        # An unknown gender matches nothing
+        gender_code = self._genders.index(gender) if gender in self._genders else -1
+
+        hourly = granularity == "hour"
+        columns: Dict[str, list] = {name: [] for name in ("bucket", "feature", "user", "clicks")}
+        day = first_day
+        while day <= last_day:
+            path = self._day_path(day)
+            if os.path.exists(path):
+                with np.load(path) as stored:
+                    # Each access decompresses, so read every array once
+                    prefix = "" if hourly else "daily_"
+                    feature = stored[prefix + "feature"]
+                    mask = np.ones(len(feature), bool)
+                    if age_code is not None:
+                        mask &= stored[prefix + "age"] == age_code
+                    if gender:
+                        mask &= stored[prefix + "gender"] == gender_code
+                    if hourly:
+                        bucket = stored["timestamp"][mask] // _MICROS_PER_HOUR
+                        clicks = np.ones(int(mask.sum()), np.int64)
+                    else:
+                        bucket = np.full(
+                            int(mask.sum()), bucket_start(day, granularity).toordinal()
+                        )
+                        clicks = stored["daily_clicks"][mask]
+                    columns["bucket"].append(bucket.astype(np.int64))
+                    columns["feature"].append(feature[mask].astype(np.int64))
+                    columns["user"].append(stored[prefix + "user"][mask].astype(np.int64))
+                    columns["clicks"].append(clicks.astype(np.int64))
+            day += timedelta(days=1)
+
+        return ArchiveSlice(
+            granularity,
+            *(
+                np.concatenate(columns[name]) if columns[name] else np.empty(0, np.int64)
+                for name in ("bucket", "feature", "user", "clicks")
+            ),
+        )
+
+    def archived_days(self) -> List[date]:
+        """UTC days that have a file, oldest first."""
+        days = []
+        for _, _, files in os.walk(self._path("clicks")):
+            days.extend(
+                date.fromisoformat(name[: -len(".npz")])
+                for name in files
+                if name.endswith(".npz") and not name.endswith(".tmp.npz")
+            )
+        return sorted(days)
+
+    def day_groups(self, day: date) -> List[Tuple[int, str, str, str, int]]:
+        """(feature id, age bucket, gender, user id, clicks) per distinct group
+        of an archived day, from its daily aggregate. Blocking file I/O."""
+        self._refresh()
+        with np.load(self._day_path(day)) as stored:
+            columns = [
+                stored[f"daily_{name}"].tolist()
+                for name in ("feature", "age", "gender", "user", "clicks")
+            ]
+        return [
+            (feature_id, AGE_BUCKETS[age], self._genders[gender], self._user_ids[user], clicks)
+            for feature_id, age, gender, user, clicks in zip(*columns)
+        ]
+
+    def day_clicks(
+        self, day: date, age_group: str | None, gender: str | None
+    ) -> List[Tuple[str, datetime, int, str, str, str]]:
+        """Raw clicks of an archived day, oldest first, filtered like the
+        dashboard: (id, timestamp, feature id, user id, age bucket, gender).
+        Blocking file I/O: call it in a thread."""
+        self._refresh()
+        path = self._day_path(day)
+        if not os.path.exists(path):
+            return []
+        age_code = AGE_BUCKETS.index(age_group) if age_group in AGE_BUCKETS else None
+        gender_code = self._genders.index(gender) if gender in self._genders else -1
+        with np.load(path) as stored:
+            columns = {
+                name: stored[name]
+                for name in ("id", "timestamp", "feature", "age", "gender", "user")
+            }
+        mask = np.ones(len(columns["id"]), bool)
+        if age_code is not None:
+            mask &= columns["age"] == age_code
+        if gender:
+            mask &= columns["gender"] == gender_code
+        order = np.argsort(columns["timestamp"][mask], kind="stable")
+        columns = {name: column[mask][order] for name, column in columns.items()}
+        return [
+            (
+                str(uuid.UUID(bytes=click_id.tobytes())),
+                _EPOCH + timedelta(microseconds=timestamp),
+                feature_id,
+                self._user_ids[user],
+                AGE_BUCKETS[age],
+                self._genders[gender_value],
+            )
+            for click_id, timestamp, feature_id, age, gender_value, user in zip(
+                columns["id"],
+                columns["timestamp"].tolist(),
+                columns["feature"].tolist(),
+                columns["age"].tolist(),
+                columns["gender"].tolist(),
+                columns["user"].tolist(),
+            )
+        ]
+
+    def clear(self) -> int:
+        """Delete every archive file (used when the database is reset)."""
+        removed = 0
+        for directory, _, files in os.walk(self.root, topdown=False):
+            for name in files:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            os.rmdir(directory)
+        self._reset()
+        return removed
+
+    # Archive job (single writer: `python manage.py archive-clicks`)
+
+    def _write_manifest(self, through: date) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        np.save(self._path("users.tmp.npy"), np.array(self._user_ids, dtype=str))
+        os.replace(self._path("users.tmp.npy"), self._path("users.npy"))
+        with open(self._path("manifest.tmp.json"), "w") as f:
+            json.dump({"through": through.isoformat(), "genders": self._genders}, f)
+        # Readers notice the new mtime and reload
+        os.replace(self._path("manifest.tmp.json"), self._path("manifest.json"))
+
+    def _code(self, table: Dict[str, int], values: List[str], value: str) -> int:
+        code = table.get(value)
+        if code is None:
+            code = table[value] = len(values)
+            values.append(value)
+        return code
+
+    def _write_day(self, day: date, rows) -> int:
+        """Merge rows into the day's file (ids already there are skipped, so
+        a rerun after a failed delete does not duplicate). Returns rows added."""
+        path = self._day_path(day)
+        genders = {gender: code for code, gender in enumerate(self._genders)}
+        existing = {}
+        if os.path.exists(path):
+            with np.load(path) as stored:
+                existing = {name: stored[name] for name in stored.files}
+        seen = {bytes(click_id) for click_id in existing.get("id", [])}
+
+        new = {name: [] for name in ("id", "timestamp", "feature", "age", "gender", "user")}
+        for click_id, user_id, timestamp, feature_id, age_bucket, gender in rows:
+            click_bytes = uuid.UUID(str(click_id)).bytes
+            if click_bytes in seen:
+                continue
+            new["id"].append(np.frombuffer(click_bytes, np.uint8))
+            new["timestamp"].append((timestamp - _EPOCH) // timedelta(microseconds=1))
+            new["feature"].append(feature_id)
+            new["age"].append(AGE_BUCKETS.index(age_bucket))
+            new["gender"].append(self._code(genders, self._genders, gender))
+            new["user"].append(self._code(self._user_codes, self._user_ids, str(user_id)))
+        added = len(new["id"])
+        if not added:
+            return 0
+
+        dtypes = {
+            "timestamp": np.int64, "feature": np.int32, "age": np.int8,
+            "gender": np.int16, "user": np.int32,
+        }
+        merged = {"id": np.stack(new["id"])}
+        merged.update({name: np.array(new[name], dtype) for name, dtype in dtypes.items()})
+        if existing:
+            merged = {
+                name: np.concatenate([existing[name], column])
+                for name, column in merged.items()
+            }
+
+        # Daily aggregate: clicks per distinct (feature, age, gender, user)
+        groups, clicks = np.unique(
+            np.stack(
+                [merged[name].astype(np.int64) for name in ("feature", "age", "gender", "user")],
+                axis=1,
+            ),
+            axis=0,
+            return_counts=True,
+        )
+        for index, name in enumerate(("feature", "age", "gender", "user")):
+            merged[f"daily_{name}"] = groups[:, index].astype(dtypes[name])
+        merged["daily_clicks"] = clicks.astype(np.int32)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path[: -len(".npz")] + ".tmp.npz"
+        np.savez_compressed(tmp_path, **merged)
+        os.replace(tmp_path, path)
+        return added
+
+    async def archive(self, engine: AsyncEngine, before: date) -> Dict[str, int]:
+        """Move clicks of UTC days before ``before`` into day files.
+
+        Oldest day first, one transaction per day: the file and manifest are
+        written, then the day's rows are deleted by id (so clicks inserted
+        meanwhile are never deleted unarchived). Returns {day: clicks}.
+        """
+        self._refresh()
+        moved: Dict[str, int] = {}
+        end = utc_start(before)
+        age = func.coalesce(FeatureClick.age_bucket, age_bucket_expr(UserModel.age))
+        gender = func.coalesce(FeatureClick.gender, UserModel.gender)
+        while True:
+            async with engine.begin() as conn:
+                oldest = (
+                    await conn.execute(
+                        select(func.min(FeatureClick.timestamp)).where(
+                            FeatureClick.timestamp < end
+                        )
+                    )
+                ).scalar()
+                if oldest is None:
+                    break
+                if oldest.tzinfo is None:  # SQLite drops the offset
+                    oldest = oldest.replace(tzinfo=timezone.utc)
+                day = oldest.astimezone(timezone.utc).date()
+                start = utc_start(day)
+                result = await conn.execute(
+                    select(
+                        FeatureClick.id,
+                        FeatureClick.user_id,
+                        FeatureClick.timestamp,
+                        FeatureClick.feature_id,
+                        age,
+                        gender,
+                    )
+                    .join(UserModel)
+                    .where(
+                        FeatureClick.timestamp >= start,
+                        FeatureClick.timestamp < start + timedelta(days=1),
+                    )
+                )
+                rows = [
+                    (click_id, user_id, ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc),
+                     feature_id, age_bucket, user_gender)
+                    for click_id, user_id, ts, feature_id, age_bucket, user_gender in result.all()
+                ]
+                self._write_day(day, rows)
+                self._write_manifest(max(day, self._through or day))
+                self._through = max(day, self._through or day)
+
+                ids = [row[0] for row in rows]
+                for offset in range(0, len(ids), ARCHIVE_DELETE_BATCH):
+                    await conn.execute(
+                        delete(FeatureClick).where(
+                            FeatureClick.id.in_(ids[offset : offset + ARCHIVE_DELETE_BATCH])
+                        )
+                    )
+            moved[day.isoformat()] = len(rows)
+            print(f"   🧊 {day}: {len(rows)} clicks archived", flush=True)
+
+        # Every day before the cutoff is archived now, including empty ones
+        through = before - timedelta(days=1)
+        if self._through is None or through > self._through:
+            self._write_manifest(through)
+            self._through = through
+        return moved
+
+
+click_archive = ClickArchive(ARCHIVE_DIR)
@@ -1,15 +1,22 @@
 from pwdlib import PasswordHash
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..model.user import User as UserModel
+from ..schema.user import CurrentUser
 from ..config.database import get_db
+from .cache import TTLCache
+from .metrics import AUTH_HASH_SECONDS, AUTH_USER_SECONDS
 
 
 # Load environment variables
@@ -18,13 +25,31 @@ load_dotenv()
 # Password hashing configuration
 password_hash = PasswordHash.recommended()
 
+# Argon2 worker pool: hashing runs off the event loop, capped in size
+HASH_MAX_WORKERS = int(os.getenv("HASH_MAX_WORKERS", "2"))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))
+
 # JWT Configuration from environment variables
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-for-development-only")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
+# Usernames allowed on /admin endpoints (comma separated, empty = nobody)
+ADMIN_USERNAMES = {
+    name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()
+}
+
+# Auth cache: decoded tokens and resolved users, so repeat requests skip
+# HMAC verification and the user lookup
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "60"))
+
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_S)
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_S)
+
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/users/login", auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -37,6 +62,95 @@ def get_password_hash(password: str) -> str:
     return password_hash.hash(password)
 
 
+class HashPool:
+    """Bounded thread pool for Argon2 work with queue-depth counters.
+
+    argon2-cffi releases the GIL while hashing, so threads give real
+    parallelism. When ``max_queue`` jobs are already waiting, new work is
+    rejected with 503 instead of queueing without limit.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="argon2"
+        )
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication is busy, retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.queued += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.wait_seconds += started - submitted
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.hash_seconds += time.perf_counter() - started
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds_total": round(self.wait_seconds, 6),
+                "hash_seconds_total": round(self.hash_seconds, 6),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hash_pool = HashPool(HASH_MAX_WORKERS, HASH_MAX_QUEUE)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the Argon2 worker pool."""
+    started = time.perf_counter()
+    try:
+        return await hash_pool.run(verify_password, plain_password, hashed_password)
+    finally:
+        AUTH_HASH_SECONDS.observe(time.perf_counter() - started, operation="verify")
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the Argon2 worker pool."""
+    started = time.perf_counter()
+    try:
+        return await hash_pool.run(get_password_hash, password)
+    finally:
+        AUTH_HASH_SECONDS.observe(time.perf_counter() - started, operation="hash")
+
+
 def create_access_token(data: Dict[str, Any]) -> str:
     """Create JWT token with expiration."""
     to_encode = data.copy()
@@ -53,25 +167,51 @@ def verify_access_token(token: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _decode_cached(token: str) -> Optional[Dict[str, Any]]:
+    """Decode a token, reusing the payload of a previously verified token.
+
+    A cached payload never outlives the token's own ``exp``.
+    """
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = verify_access_token(token)
+    if payload is None:
+        return None
+
+    ttl = AUTH_CACHE_TTL_S
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        token_cache.set(token, payload, ttl)
+    return payload
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
-) -> UserModel:
+) -> CurrentUser:
 
     error = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    started = time.perf_counter()
 
     # Decode Token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise error
-    except JWTError:
+    payload = _decode_cached(token)
+    if not payload:
+        raise error
+    user_id = payload.get("sub")
+    if not user_id:
         raise error
 
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        AUTH_USER_SECONDS.observe(time.perf_counter() - started, cache="hit")
+        return principal
+
     # Find user in database
     result = await db.execute(select(UserModel).where(UserModel.id == user_id))
     user = result.scalars().first()
@@ -79,4 +219,28 @@ async def get_current_user(
     if not user:
         raise error
 
+    principal = CurrentUser.model_validate(user)
+    principal_cache.set(user_id, principal)
+    AUTH_USER_SECONDS.observe(time.perf_counter() - started, cache="miss")
+    return principal
+
+
+async def get_current_user_stream(
+    token: Optional[str] = Query(None),
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
+    """get_current_user that also accepts ``?token=``.
+
+    Browsers' EventSource cannot set an Authorization header.
+    """
+    return await get_current_user(header_token or token or "", db)
+
+
+async def get_admin_user(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    """get_current_user restricted to ADMIN_USERNAMES."""
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
+        )
     return user
@@ -0,0 +1,17 @@
+from datetime import date, timedelta
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First day of the day, week or month bucket containing ``day``."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # Monday, like bucket_expr
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_end(start: date, granularity: str) -> date:
+    """Last day of the week or month bucket starting on ``start``."""
+    if granularity == "week":
+        return start + timedelta(days=6)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
@@ -0,0 +1,60 @@
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from ..model.featureclick import FeatureClick
+from ..model.user import User as UserModel
+
+# Age groups exposed by the dashboard filter (bounds are inclusive)
+AGE_BUCKETS = ("<18", "18-40", ">40")
+
+# Users whose clicks are backfilled per transaction
+CLICK_BACKFILL_BATCH_USERS = 500
+
+
+def age_bucket(age: int) -> str:
+    """Map an age to the dashboard's age group."""
+    if age < 18:
+        return "<18"
+    if age <= 40:
+        return "18-40"
+    return ">40"
+
+
+def age_bucket_expr(age_column):
+    """SQL CASE expression equivalent of ``age_bucket``."""
+    return case(
+        (age_column < 18, "<18"),
+        (age_column <= 40, "18-40"),
+        else_=">40",
+    )
+
+
+async def backfill_click_demographics(engine: AsyncEngine) -> int:
+    """Copy age bucket and gender from user onto clicks that lack them.
+
+    Walks users in id order and commits after every batch, so row locks are
+    short-lived and an interrupted run resumes where it stopped (only NULL
+    rows are touched). Returns the number of clicks updated.
+    """
+    updated = 0
+    last_id = None
+    while True:
+        async with engine.begin() as conn:
+            query = select(UserModel.id).order_by(UserModel.id)
+            if last_id is not None:
+                query = query.where(UserModel.id > last_id)
+            result = await conn.execute(query.limit(CLICK_BACKFILL_BATCH_USERS))
+            user_ids = result.scalars().all()
+            if not user_ids:
+                return updated
+            result = await conn.execute(
+                update(FeatureClick)
+                .where(
+                    FeatureClick.user_id == UserModel.id,
+                    UserModel.id.in_(user_ids),
+                    FeatureClick.age_bucket.is_(None),
+                )
+                .values(age_bucket=age_bucket_expr(UserModel.age), gender=UserModel.gender)
+            )
+            updated += result.rowcount
+        last_id = user_ids[-1]
+        print(f"   {updated:>12,} clicks updated", flush=True)
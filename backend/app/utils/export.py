@@ -0,0 +1,138 @@
+import asyncio
+import csv
+import io
+import json
+import os
+from datetime import date, timedelta
+from typing import AsyncIterator
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from ..model.feature import Feature
+from ..model.featureclick import FeatureClick
+from .admission import ConcurrencyLimiter
+from .analytics import click_filters
+from .archive import click_archive
+from .features import feature_registry
+
+
+# Load environment variables
+load_dotenv()
+
+# Rows fetched from the server-side cursor (and written) per chunk
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+# Admission control: each export holds a pooled connection until its body is
+# sent, so only a few run at once per process; by default the rest are shed
+# with 503 + Retry-After at once instead of queueing behind long downloads
+EXPORT_MAX_CONCURRENCY = int(os.getenv("EXPORT_MAX_CONCURRENCY", "2"))
+EXPORT_MAX_QUEUE = int(os.getenv("EXPORT_MAX_QUEUE", "0"))
+EXPORT_QUEUE_TIMEOUT_S = float(os.getenv("EXPORT_QUEUE_TIMEOUT_S", "5"))
+EXPORT_RETRY_AFTER_S = int(os.getenv("EXPORT_RETRY_AFTER_S", "30"))
+
+export_limiter = ConcurrencyLimiter(
+    "export",
+    EXPORT_MAX_CONCURRENCY,
+    EXPORT_MAX_QUEUE,
+    EXPORT_QUEUE_TIMEOUT_S,
+    EXPORT_RETRY_AFTER_S,
+)
+
+EXPORT_COLUMNS = ("id", "timestamp", "feature", "user_id", "age_bucket", "gender")
+
+# format -> media type
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_query(
+    s_date: date, e_date: date, age_group: str | None, gender: str | None
+):
+    """Raw clicks, oldest first (uses the timestamp index).
+
+    Age bucket and gender are the ones stored on the click, the same columns
+    the filters match, not the user's current profile.
+    """
+    return (
+        select(
+            FeatureClick.id,
+            FeatureClick.timestamp,
+            Feature.name,
+            FeatureClick.user_id,
+            FeatureClick.age_bucket,
+            FeatureClick.gender,
+        )
+        .join(Feature)
+        .where(*click_filters(s_date, e_date, age_group, gender))
+        .order_by(FeatureClick.timestamp)
+    )
+
+
+def _csv_chunk(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for click_id, timestamp, feature, user_id, age_bucket, click_gender in rows:
+        writer.writerow(
+            (click_id, timestamp.isoformat(), feature, user_id, age_bucket, click_gender)
+        )
+    return buffer.getvalue().encode()
+
+
+def _ndjson_chunk(rows) -> bytes:
+    lines = []
+    for click_id, timestamp, feature, user_id, age_bucket, click_gender in rows:
+        record = (
+            click_id, timestamp.isoformat(), feature, user_id, age_bucket, click_gender
+        )
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, record))) + "\n")
+    return "".join(lines).encode()
+
+
+async def stream_clicks(
+    bind: AsyncEngine,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    export_format: str,
+) -> AsyncIterator[bytes]:
+    """Encode matching clicks chunk by chunk for a StreamingResponse.
+
+    Days before the archive boundary are read from the archive's day files,
+    one day at a time; the rest comes from a server-side cursor
+    ``EXPORT_CHUNK_ROWS`` rows at a time, so memory stays flat whatever the
+    date range. The generator owns its connection on ``bind`` (primary or
+    replica): request-scoped sessions are closed before the body streams.
+    """
+    encode = _csv_chunk if export_format == "csv" else _ndjson_chunk
+    if export_format == "csv":
+        yield _csv_chunk([], header=True)
+
+    boundary = click_archive.boundary()
+    if boundary is not None and s_date < boundary:
+        day = s_date
+        while day <= e_date and day < boundary:
+            clicks = await asyncio.to_thread(click_archive.day_clicks, day, age_group, gender)
+            names = await feature_registry.names({click[2] for click in clicks})
+            for offset in range(0, len(clicks), EXPORT_CHUNK_ROWS):
+                yield encode(
+                    (click_id, timestamp, names[feature_id], user_id, age_bucket, click_gender)
+                    for click_id, timestamp, feature_id, user_id, age_bucket, click_gender
+                    in clicks[offset : offset + EXPORT_CHUNK_ROWS]
+                )
+            day += timedelta(days=1)
+        if e_date < boundary:
+            return
+        s_date = boundary
+
+    query = export_query(s_date, e_date, age_group, gender)
+    async with bind.connect() as conn:
+        result = await conn.stream(
+            query.execution_options(yield_per=EXPORT_CHUNK_ROWS)
+        )
+        async for rows in result.partitions():
+            yield encode(rows)
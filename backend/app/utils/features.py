@@ -0,0 +1,175 @@
+import asyncio
+from typing import Dict, Iterable
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from ..config.database import engine, dialect_insert
+from ..model.feature import Feature
+from ..model.featureclick import FeatureClick
+
+
+class FeatureRegistry:
+    """In-memory feature name <-> id map backed by the ``features`` table.
+
+    Known names resolve without touching the database. Unknown names are
+    inserted in their own short transaction (ON CONFLICT DO NOTHING, so
+    several workers can race safely) and committed before any click uses
+    the id, so a rolled-back click batch never leaves a dangling id behind.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _remember(self, rows) -> None:
+        for feature_id, name in rows:
+            self._ids[name] = feature_id
+            self._names[feature_id] = name
+
+    async def load(self) -> int:
+        """Warm the map with every known feature (call from the startup hook)."""
+        async with engine.connect() as conn:
+            result = await conn.execute(select(Feature.id, Feature.name))
+            self._remember(result.all())
+        return len(self._ids)
+
+    async def ids(self, names: Iterable[str]) -> Dict[str, int]:
+        """Feature ids for the given names, creating missing features."""
+        names = set(names)
+        if not names <= self._ids.keys():
+            async with self._lock:
+                missing = names - self._ids.keys()
+                if missing:
+                    await self._create(missing)
+        return {name: self._ids[name] for name in names}
+
+    def cached_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        """Ids of names already in memory (e.g. just written by insert_clicks)."""
+        return {name: self._ids[name] for name in names if name in self._ids}
+
+    async def names(self, feature_ids: Iterable[int]) -> Dict[int, str]:
+        """Feature names for ids, e.g. from a GROUP BY feature_id result."""
+        feature_ids = set(feature_ids)
+        missing = feature_ids - self._names.keys()
+        if missing:
+            # Created by another worker since our last load
+            async with engine.connect() as conn:
+                result = await conn.execute(
+                    select(Feature.id, Feature.name).where(Feature.id.in_(missing))
+                )
+                self._remember(result.all())
+        return {feature_id: self._names[feature_id] for feature_id in feature_ids}
+
+    async def _create(self, names: set) -> None:
+        async with engine.begin() as conn:
+            stmt = dialect_insert(conn.dialect.name, Feature).values(
+                [{"name": name} for name in sorted(names)]
+            )
+            await conn.execute(stmt.on_conflict_do_nothing(index_elements=["name"]))
+            result = await conn.execute(
+                select(Feature.id, Feature.name).where(Feature.name.in_(names))
+            )
+            self._remember(result.all())
+
+
+feature_registry = FeatureRegistry()
+
+
+async def _column_type(conn: AsyncConnection, table: str, column: str) -> str | None:
+    result = await conn.execute(
+        text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() "
+            "AND table_name = :table AND column_name = :column"
+        ),
+        {"table": table, "column": column},
+    )
+    return result.scalar()
+
+
+async def click_storage_compact(conn: AsyncConnection) -> bool:
+    """True once feature_clicks stores feature ids instead of names."""
+    return await _column_type(conn, FeatureClick.__tablename__, "feature_id") is not None
+
+
+async def compact_click_storage(conn: AsyncConnection) -> int:
+    """Migrate an existing PostgreSQL database to the compact click layout.
+
+    1. feature_name text -> feature_id integer referencing ``features``
+    2. user.id, feature_clicks.id and feature_clicks.user_id text -> uuid
+
+    Each step is skipped when already applied. Runs in the caller's
+    transaction; the type change rewrites the table, so dead tuples left by
+    the feature_id backfill are reclaimed in the same run. Returns the
+    number of clicks in the table.
+    """
+    clicks = FeatureClick.__tablename__
+    await conn.run_sync(Feature.__table__.create, checkfirst=True)
+
+    if await _column_type(conn, clicks, "feature_name") is not None:
+        print("   🔤 Moving feature names into the features table...")
+        await conn.execute(
+            text(
+                f"INSERT INTO features (name) SELECT DISTINCT feature_name FROM {clicks} "
+                "ON CONFLICT (name) DO NOTHING"
+            )
+        )
+        await conn.execute(
+            text(f"ALTER TABLE {clicks} ADD COLUMN IF NOT EXISTS feature_id integer")
+        )
+        await conn.execute(
+            text(
+                f"UPDATE {clicks} c SET feature_id = f.id "
+                "FROM features f WHERE f.name = c.feature_name"
+            )
+        )
+        await conn.execute(
+            text(f"ALTER TABLE {clicks} ALTER COLUMN feature_id SET NOT NULL")
+        )
+        # Also drops the old (timestamp, feature_name) index
+        await conn.execute(text(f"ALTER TABLE {clicks} DROP COLUMN feature_name"))
+        await conn.execute(
+            text(
+                f"ALTER TABLE {clicks} ADD CONSTRAINT {clicks}_feature_id_fkey "
+                "FOREIGN KEY (feature_id) REFERENCES features (id)"
+            )
+        )
+
+    uuid_columns = [("user", "id"), (clicks, "user_id"), (clicks, "id")]
+    if any([await _column_type(conn, t, c) != "uuid" for t, c in uuid_columns]):
+        print("   🆔 Converting ids to native uuid...")
+        # Foreign keys into user.id must be dropped while the types differ.
+        # Constraints cloned onto partitions follow their parent.
+        result = await conn.execute(
+            text(
+                "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) "
+                "FROM pg_constraint WHERE contype = 'f' AND conparentid = 0 "
+                """AND confrelid = CAST('"user"' AS regclass)"""
+            )
+        )
+        foreign_keys = result.all()
+        for table, name, _ in foreign_keys:
+            await conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+        for table, column in uuid_columns:
+            await conn.execute(
+                text(
+                    f'ALTER TABLE "{table}" ALTER COLUMN {column} '
+                    f"TYPE uuid USING {column}::uuid"
+                )
+            )
+        for table, name, definition in foreign_keys:
+            await conn.execute(
+                text(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+            )
+
+    def create_indexes(sync_conn):
+        for index in FeatureClick.__table__.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+    await conn.run_sync(create_indexes)
+    await conn.execute(text(f"ANALYZE {clicks}"))
+    result = await conn.execute(text(f"SELECT count(*) FROM {clicks}"))
+    return result.scalar()
@@ -0,0 +1,341 @@
+import asyncio
+import os
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, List
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import select
+from ..config.database import engine
+from ..model.featureclick import FeatureClick
+from .buckets import bucket_start
+from .demographics import AGE_BUCKETS
+from .features import feature_registry
+from .rollup import utc_day
+
+
+# Load environment variables
+load_dotenv()
+
+# Keep the last N UTC days of clicks in memory (0 = hot tier off)
+HOT_TIER_DAYS = int(os.getenv("HOT_TIER_DAYS", "0"))
+# Full reload interval; picks up clicks written by other workers
+HOT_TIER_REFRESH_S = float(os.getenv("HOT_TIER_REFRESH_S", "300"))
+# Workers delay their first load by a random 0..N seconds, so they do not
+# all scan the table at once on boot (serve.py sets it for several workers)
+HOT_TIER_START_SPREAD_S = float(os.getenv("HOT_TIER_START_SPREAD_S", "0"))
+HOT_TIER_LOAD_CHUNK_ROWS = 50_000
+
+
+def _utc_ordinal(timestamp: datetime) -> int:
+    return timestamp.astimezone(timezone.utc).date().toordinal()
+
+
+class _Snapshot:
+    """Click columns for one load, grown in place as clicks are appended.
+
+    Users and genders are interned to small integer codes; the age column
+    holds the index of the click's bucket in AGE_BUCKETS (-1 when unknown).
+    """
+
+    def __init__(self, start_day: int, capacity: int = 1024):
+        self.start_day = start_day  # first UTC day ordinal held
+        self.size = 0
+        self.day = np.empty(capacity, np.int32)
+        self.feature = np.empty(capacity, np.int32)
+        self.age = np.empty(capacity, np.int8)
+        self.gender = np.empty(capacity, np.int16)
+        self.user = np.empty(capacity, np.int32)
+        self.genders: Dict[str, int] = {}
+        self.users: Dict[str, int] = {}
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self.day):
+            return
+        capacity = max(needed, len(self.day) * 3 // 2)
+        for name in ("day", "feature", "age", "gender", "user"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, column.dtype)
+            grown[: self.size] = column[: self.size]
+            setattr(self, name, grown)
+
+    def extend(self, days, features, ages, genders, users) -> None:
+        """Append rows given as parallel lists (age bucket names, raw ids)."""
+        count = len(days)
+        self._reserve(count)
+        end = self.size + count
+        age_codes = {bucket: code for code, bucket in enumerate(AGE_BUCKETS)}
+        self.day[self.size : end] = days
+        self.feature[self.size : end] = features
+        self.age[self.size : end] = [age_codes.get(bucket, -1) for bucket in ages]
+        self.gender[self.size : end] = [
+            self.genders.setdefault(gender, len(self.genders)) for gender in genders
+        ]
+        self.user[self.size : end] = [
+            self.users.setdefault(str(user), len(self.users)) for user in users
+        ]
+        self.size = end
+
+    def columns(self):
+        size = self.size
+        return (
+            self.day[:size],
+            self.feature[:size],
+            self.age[:size],
+            self.gender[:size],
+            self.user[:size],
+        )
+
+
+class HotTier:
+    """In-process columnar copy of the last ``days`` days of clicks.
+
+    Loaded in the background at startup and reloaded every ``refresh_s``;
+    clicks committed by this worker are appended as they are written, so its
+    own ingest shows up immediately and other workers' clicks within one
+    refresh. Dashboard ranges that start inside the window (day, week or
+    month buckets) are aggregated with NumPy bincounts, no database round
+    trip; everything else falls back to SQL.
+    """
+
+    def __init__(self, days: int, refresh_s: float):
+        self.days = days
+        self.refresh_s = refresh_s
+        self._snapshot: _Snapshot | None = None
+        # Rows written while a reload is reading the table
+        self._written_during_load: List[Dict[str, Any]] | None = None
+        self._task: asyncio.Task | None = None
+        self.loaded_at: float | None = None
+        self.load_seconds: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.days > 0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    async def start(self) -> None:
+        """Start the load/refresh task (call from the startup hook)."""
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        # Until the first load, dashboards are answered by SQL
+        await asyncio.sleep(random.uniform(0, HOT_TIER_START_SPREAD_S))
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"❌ Hot tier load failed: {e}")
+            # Jittered so workers started together drift apart
+            await asyncio.sleep(self.refresh_s * random.uniform(0.9, 1.1))
+
+    async def reload(self) -> int:
+        """Read the window from the database and swap it in."""
+        started = time.perf_counter()
+        first_day = datetime.now(timezone.utc).date() - timedelta(days=self.days - 1)
+        snapshot = _Snapshot(first_day.toordinal())
+        self._written_during_load = []
+        try:
+            async with engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    # One snapshot for the scan and the overlap check below
+                    conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+                await self._load(conn, snapshot, first_day)
+
+                # Rows written during the scan: skip those it already saw
+                written = self._written_during_load
+                ids = [row["id"] for row in written]
+                seen = set()
+                for start in range(0, len(ids), 1000):
+                    result = await conn.execute(
+                        select(FeatureClick.id).where(
+                            FeatureClick.id.in_(ids[start : start + 1000])
+                        )
+                    )
+                    seen.update(str(click_id) for click_id in result.scalars())
+            # No awaits from here on, so no click can slip between the two
+            self._snapshot = snapshot
+            self._append_to(
+                snapshot, [row for row in written if str(row["id"]) not in seen]
+            )
+        finally:
+            self._written_during_load = None
+
+        self.loaded_at = time.time()
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        print(
+            f"🔥 Hot tier loaded {snapshot.size} clicks since {first_day} "
+            f"in {self.load_seconds}s"
+        )
+        return snapshot.size
+
+    async def _load(self, conn, snapshot: _Snapshot, first_day: date) -> None:
+        day = utc_day(FeatureClick.timestamp, conn.dialect.name)
+        query = (
+            select(
+                day,
+                FeatureClick.feature_id,
+                FeatureClick.age_bucket,
+                FeatureClick.gender,
+                FeatureClick.user_id,
+            )
+            .where(
+                FeatureClick.timestamp
+                >= datetime.combine(first_day, dt_time.min, tzinfo=timezone.utc)
+            )
+        )
+        result = await conn.stream(
+            query.execution_options(yield_per=HOT_TIER_LOAD_CHUNK_ROWS)
+        )
+        async for rows in result.partitions():
+            days, features, ages, genders, users = zip(*rows)
+            snapshot.extend(
+                [
+                    # SQLite's date() comes back as text
+                    (date.fromisoformat(d) if isinstance(d, str) else d).toordinal()
+                    for d in days
+                ],
+                features,
+                ages,
+                genders,
+                users,
+            )
+
+    def _append_to(self, snapshot: _Snapshot, rows: List[Dict[str, Any]]) -> None:
+        # insert_clicks has resolved every name, so the registry knows them
+        feature_ids = feature_registry.cached_ids({row["feature_name"] for row in rows})
+        rows = [
+            row
+            for row in rows
+            if _utc_ordinal(row["timestamp"]) >= snapshot.start_day
+            and row["feature_name"] in feature_ids
+        ]
+        if not rows:
+            return
+        snapshot.extend(
+            [_utc_ordinal(row["timestamp"]) for row in rows],
+            [feature_ids[row["feature_name"]] for row in rows],
+            [row["age_bucket"] for row in rows],
+            [row["gender"] for row in rows],
+            [row["user_id"] for row in rows],
+        )
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        """Add committed ingest rows (with age_bucket and gender)."""
+        if self._written_during_load is not None:
+            self._written_during_load.extend(rows)
+        if self._snapshot is not None:
+            self._append_to(self._snapshot, rows)
+
+    def covers(self, s_date: date, granularity: str) -> bool:
+        """Whether a query can be answered from memory."""
+        return (
+            self._snapshot is not None
+            and granularity != "hour"
+            and s_date.toordinal() >= self._snapshot.start_day
+        )
+
+    def aggregate(
+        self,
+        s_date: date,
+        e_date: date,
+        age_group: str | None,
+        gender: str | None,
+        granularity: str,
+    ) -> Dict[str, Any] | None:
+        """Clicks and unique users per (bucket, feature id) plus per-feature
+        unique users, or None when the snapshot cannot answer.
+
+        Returns ``{"series": [(bucket, feature_id, clicks, users)],
+        "totals": {feature_id: users}}`` with buckets in order.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or s_date.toordinal() < snapshot.start_day:
+            return None
+        day, feature, age, gender_code, user = snapshot.columns()
+
+        first, last = s_date.toordinal(), e_date.toordinal()
+        mask = (day >= first) & (day <= last)
+        if age_group in AGE_BUCKETS:
+            mask &= age == AGE_BUCKETS.index(age_group)
+        if gender:
+            code = snapshot.genders.get(gender)
+            if code is None:
+                return {"series": [], "totals": {}}
+            mask &= gender_code == code
+
+        offsets = day[mask] - first
+        features = feature[mask]
+        users = user[mask].astype(np.int64)
+        if not len(features):
+            return {"series": [], "totals": {}}
+
+        # Bucket index for every day offset in the range
+        labels: List[date] = []
+        bucket_of_offset = np.empty(last - first + 1, np.int64)
+        for offset in range(last - first + 1):
+            start = bucket_start(date.fromordinal(first + offset), granularity)
+            if not labels or labels[-1] != start:
+                labels.append(start)
+            bucket_of_offset[offset] = len(labels) - 1
+
+        feature_count = int(features.max()) + 1
+        cells = bucket_of_offset[offsets] * feature_count + features
+        clicks = np.bincount(cells, minlength=len(labels) * feature_count)
+
+        # Distinct (cell, user) pairs, then distinct users per cell
+        user_count = len(snapshot.users)
+        cell_users = np.bincount(
+            np.unique(cells * user_count + users) // user_count,
+            minlength=len(labels) * feature_count,
+        )
+        feature_users = np.bincount(
+            np.unique(features.astype(np.int64) * user_count + users) // user_count,
+            minlength=feature_count,
+        )
+
+        series = [
+            (
+                labels[cell // feature_count],
+                cell % feature_count,
+                int(clicks[cell]),
+                int(cell_users[cell]),
+            )
+            for cell in np.flatnonzero(clicks).tolist()
+        ]
+        totals = {
+            feature_id: int(feature_users[feature_id])
+            for feature_id in np.flatnonzero(feature_users).tolist()
+        }
+        return {"series": series, "totals": totals}
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "ready": snapshot is not None,
+            "days": self.days,
+            "clicks": snapshot.size if snapshot else 0,
+            "since": date.fromordinal(snapshot.start_day).isoformat() if snapshot else None,
+            "users": len(snapshot.users) if snapshot else 0,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+        }
+
+
+hot_tier = HotTier(HOT_TIER_DAYS, HOT_TIER_REFRESH_S)
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config.database import AsyncSessionLocal
+from ..model.featureclick import FeatureClick
+from .analytics import (
+    ANALYTICS_USE_ROLLUP,
+    ANALYTICS_USE_SKETCHES,
+    invalidate_analytics,
+)
+from .demographics import age_bucket
+from .features import feature_registry
+from .hottier import hot_tier
+from .live import click_feed
+from .rollup import bump_rollup
+from .uniques import bump_sketches
+
+
+# Load environment variables
+load_dotenv()
+
+# Write-behind buffer configuration from environment variables
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
+INGEST_FLUSH_MS = int(os.getenv("INGEST_FLUSH_MS", "250"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "10000"))
+INGEST_DRAIN_TIMEOUT_S = float(os.getenv("INGEST_DRAIN_TIMEOUT_S", "10"))
+INGEST_MAX_RETRIES = 3
+# /track/batch drops events whose client timestamp is older than this
+INGEST_MAX_CLICK_AGE_S = int(os.getenv("INGEST_MAX_CLICK_AGE_S", "600"))
+
+
+def click_row(user, feature_name: str, timestamp: datetime) -> Dict[str, Any]:
+    """Build an ingest row: click columns, including the user's age bucket
+    and gender, which also key the rollup."""
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user.id,
+        "feature_name": feature_name,
+        "timestamp": timestamp,
+        "age_bucket": age_bucket(user.age),
+        "gender": user.gender,
+    }
+
+
+async def insert_clicks(db: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """Write click rows with a single multi-row INSERT and, when analytics
+    reads them, update the daily rollup and unique-user sketches in the same
+    transaction (caller commits)."""
+    if not rows:
+        return 0
+    feature_ids = await feature_registry.ids({row["feature_name"] for row in rows})
+    values = [
+        {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "feature_id": feature_ids[row["feature_name"]],
+            "timestamp": row["timestamp"],
+            "age_bucket": row["age_bucket"],
+            "gender": row["gender"],
+        }
+        for row in rows
+    ]
+    await db.execute(insert(FeatureClick).values(values))
+    if ANALYTICS_USE_ROLLUP:
+        await bump_rollup(db, rows)
+    if ANALYTICS_USE_SKETCHES:
+        await bump_sketches(db, rows)
+    return len(rows)
+
+
+async def write_clicks(db: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """Insert and commit click rows, then drop cached analytics they affect,
+    add them to the in-memory hot tier and push the new counts to live
+    dashboards."""
+    inserted = await insert_clicks(db, rows)
+    await db.commit()
+    invalidate_analytics(
+        {row["timestamp"].astimezone(timezone.utc).date() for row in rows}
+    )
+    hot_tier.append(rows)
+    click_feed.publish(rows)
+    return inserted
+
+
+class BufferFull(Exception):
+    """Raised when the pending queue is at its limit (backpressure)."""
+
+
+class ClickBuffer:
+    """Collects click rows in memory and flushes them in bulk.
+
+    A flush happens when ``batch_size`` rows are pending or ``flush_ms``
+    milliseconds have passed since the first pending row, whichever comes
+    first. ``submit`` never waits: when ``max_pending`` rows are queued it
+    raises ``BufferFull`` so the route can shed load instead of piling up.
+    """
+
+    def __init__(self, batch_size: int, flush_ms: int, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.max_pending = max_pending
+        self._queue: asyncio.Queue | None = None
+        self._batch_ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+        # Counters for observability
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.rejected_rows = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        """Start the background flush task (call from the startup hook)."""
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._batch_ready = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, row: Dict[str, Any]) -> None:
+        """Queue a row for the next flush without blocking."""
+        if not self.running:
+            raise RuntimeError("Click buffer is not running")
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.rejected_rows += 1
+            raise BufferFull()
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def stop(self) -> None:
+        """Stop accepting rows and flush everything still pending."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._batch_ready.set()
+        try:
+            await asyncio.wait_for(self._queue.join(), INGEST_DRAIN_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Click buffer drain timed out, {self.pending} rows not written")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+
+            # Wait until the batch is full or the flush interval has passed
+            if not self._closing and self._queue.qsize() < self.batch_size - 1:
+                try:
+                    await asyncio.wait_for(
+                        self._batch_ready.wait(), self.flush_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            await self._flush(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(1, INGEST_MAX_RETRIES + 1):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await write_clicks(db, batch)
+                self.flushed_rows += len(batch)
+                return
+            except Exception as e:
+                print(f"❌ Click flush failed (attempt {attempt}): {e}")
+                await asyncio.sleep(0.1 * attempt)
+        self.failed_rows += len(batch)
+
+
+click_buffer = ClickBuffer(INGEST_BATCH_SIZE, INGEST_FLUSH_MS, INGEST_MAX_PENDING)
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+from collections import Counter
+from datetime import timezone
+from typing import Any, AsyncIterator, Dict, List
+from dotenv import load_dotenv
+from .demographics import AGE_BUCKETS
+
+
+# Load environment variables
+load_dotenv()
+
+# Deltas are summed over this window before being pushed to subscribers
+LIVE_COALESCE_MS = int(os.getenv("LIVE_COALESCE_MS", "500"))
+# Comment line sent on idle streams so proxies keep the connection open
+LIVE_HEARTBEAT_S = float(os.getenv("LIVE_HEARTBEAT_S", "15"))
+# Streams are closed after this long; EventSource reconnects on its own and
+# server shutdown never waits longer than this for open streams
+LIVE_STREAM_MAX_S = float(os.getenv("LIVE_STREAM_MAX_S", "300"))
+# Undelivered messages per subscriber before it is told to refetch instead
+LIVE_MAX_QUEUED = int(os.getenv("LIVE_MAX_QUEUED", "100"))
+LIVE_RETRY_MS = 3000
+
+
+class Subscription:
+    """One open /track/stream connection and the dashboard filters it shows."""
+
+    def __init__(self, age_group: str | None, gender: str | None, max_queued: int):
+        # Same normalization as the analytics cache: unknown age group = no filter
+        self.age_group = age_group if age_group in AGE_BUCKETS else None
+        self.gender = gender or None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+
+    def matches(self, age_bucket: str, gender: str) -> bool:
+        if self.age_group and age_bucket != self.age_group:
+            return False
+        return not self.gender or gender == self.gender
+
+    def send(self, message) -> None:
+        """Queue a message; a subscriber that fell behind gets a single reset."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("reset", {}))
+
+
+class ClickFeed:
+    """In-process fan-out of click count deltas to SSE subscribers.
+
+    ``publish`` is called with committed click rows; counts are summed per
+    (feature, UTC day, age bucket, gender) and every ``coalesce_ms`` each
+    subscriber receives one message with the (feature, day, +n) deltas that
+    match its filters. Only clicks written by this process are seen, so
+    with several workers a dashboard gets the share ingested by the worker
+    it is connected to plus whatever it re-fetches.
+    """
+
+    def __init__(self, coalesce_ms: int, max_queued: int):
+        self.interval = coalesce_ms / 1000
+        self.max_queued = max_queued
+        self._subscribers: set[Subscription] = set()
+        self._pending: Counter = Counter()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def start(self) -> None:
+        """Start the coalescing task (call from the startup hook)."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for subscription in self._subscribers:
+            subscription.send(None)
+
+    def subscribe(self, age_group: str | None, gender: str | None) -> Subscription:
+        subscription = Subscription(age_group, gender, self.max_queued)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, rows: List[Dict[str, Any]]) -> None:
+        """Record committed click rows (ingest rows with age_bucket and gender)."""
+        if not self._subscribers:
+            return
+        self._pending.update(
+            (
+                row["feature_name"],
+                row["timestamp"].astimezone(timezone.utc).date().isoformat(),
+                row["age_bucket"],
+                row["gender"],
+            )
+            for row in rows
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._pending:
+                pending, self._pending = self._pending, Counter()
+                self._deliver(pending)
+
+    def _deliver(self, pending: Counter) -> None:
+        for subscription in self._subscribers:
+            deltas: Counter = Counter()
+            for (feature, day, age_bucket, gender), clicks in pending.items():
+                if subscription.matches(age_bucket, gender):
+                    deltas[(feature, day)] += clicks
+            if deltas:
+                subscription.send(
+                    (
+                        "clicks",
+                        {
+                            "deltas": [
+                                {"feature": feature, "day": day, "clicks": clicks}
+                                for (feature, day), clicks in sorted(deltas.items())
+                            ]
+                        },
+                    )
+                )
+
+
+click_feed = ClickFeed(LIVE_COALESCE_MS, LIVE_MAX_QUEUED)
+
+
+async def stream_events(
+    age_group: str | None, gender: str | None
+) -> AsyncIterator[str]:
+    """Server-Sent Events body for one subscriber.
+
+    Event ``clicks`` carries ``{"deltas": [{"feature", "day", "clicks"}]}``;
+    event ``reset`` means deltas were dropped and the client should refetch.
+    """
+    subscription = click_feed.subscribe(age_group, gender)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LIVE_STREAM_MAX_S
+    try:
+        yield f"retry: {LIVE_RETRY_MS}\n\n"
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), min(LIVE_HEARTBEAT_S, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                return
+            event, data = message
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        click_feed.unsubscribe(subscription)
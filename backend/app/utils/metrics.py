@@ -0,0 +1,339 @@
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Latency buckets in seconds (Prometheus style, +Inf is implicit)
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# DB seconds spent by the current request; None outside requests
+_request_db_time: contextvars.ContextVar[List[float] | None] = contextvars.ContextVar(
+    "request_db_time", default=None
+)
+# ASGI scope of the current request (routing fills in scope["route"])
+_request_scope: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "request_scope", default=None
+)
+
+
+def current_route() -> str | None:
+    """Route template of the request being served, if any."""
+    scope = _request_scope.get()
+    if scope is None:
+        return None
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                )
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or read from ``callback`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Callable[[], float] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        if self.callback is not None:
+            lines.append(f"{self.name} {_format_value(self.callback())}")
+            return lines
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                )
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts incl. +Inf, sum, count)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    le = bound if bound == "+Inf" else _format_value(bound)
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route",
+        ("method", "route", "status"),
+    )
+)
+HTTP_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests being served", ("method",))
+)
+HTTP_REQUEST_DB_SECONDS = registry.register(
+    Histogram(
+        "http_request_db_seconds",
+        "Time spent executing SQL per HTTP request",
+        ("method", "route"),
+    )
+)
+DB_QUERY_SECONDS = registry.register(
+    Histogram("db_query_duration_seconds", "SQL statement execution time")
+)
+DB_POOL_WAIT_SECONDS = registry.register(
+    Histogram(
+        "db_pool_checkout_wait_seconds",
+        "Time waiting for a pooled connection (includes connecting)",
+    )
+)
+AUTH_HASH_SECONDS = registry.register(
+    Histogram(
+        "auth_hash_seconds",
+        "Argon2 time including hash pool queueing",
+        ("operation",),
+    )
+)
+AUTH_USER_SECONDS = registry.register(
+    Histogram(
+        "auth_current_user_seconds",
+        "Token decode and user lookup time",
+        ("cache",),
+    )
+)
+
+ADMISSION_WAIT_SECONDS = registry.register(
+    Histogram(
+        "admission_wait_seconds",
+        "Time queued for a concurrency limiter slot",
+        ("limiter",),
+    )
+)
+ADMISSION_REJECTED = registry.register(
+    Counter(
+        "admission_rejected_total",
+        "Requests shed with 503 by a concurrency limiter",
+        ("limiter", "reason"),
+    )
+)
+REQUESTS_COALESCED = registry.register(
+    Counter(
+        "requests_coalesced_total",
+        "Requests answered by an identical call already in flight",
+        ("flight",),
+    )
+)
+
+APP_STARTUP_SECONDS = registry.register(
+    Gauge(
+        "app_startup_seconds",
+        "Worker cold start: imports, startup hook, and total since launch",
+        ("phase",),
+    )
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement and charge it to the current request."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.observe(elapsed)
+        request_db_time = _request_db_time.get()
+        if request_db_time is not None:
+            request_db_time[0] += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        started = exception_context.connection and exception_context.connection.info.get(
+            "query_started"
+        )
+        if started:
+            started.pop()
+
+
+def register_pool_gauges(pool_stats: Callable[[], dict]) -> None:
+    for field, documentation in (
+        ("checked_out", "Connections currently checked out"),
+        ("checked_in", "Idle connections in the pool"),
+        ("overflow", "Connections opened beyond pool_size"),
+    ):
+        registry.register(
+            Gauge(
+                f"db_pool_{field}",
+                documentation,
+                callback=lambda field=field: pool_stats()[field],
+            )
+        )
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: latency, in-flight and DB time per route.
+
+    Routes are labelled by their path template (``/track/analytics``), never
+    the raw URL, so label cardinality stays bounded. Metrics are per process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        db_time = [0.0]
+        token = _request_db_time.set(db_time)
+        scope_token = _request_scope.set(scope)
+        # The route is only known after routing, so in-flight is per method
+        HTTP_IN_FLIGHT.inc(method=method)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = current_route()
+            HTTP_IN_FLIGHT.dec(method=method)
+            HTTP_REQUEST_SECONDS.observe(
+                elapsed, method=method, route=route, status=status_code
+            )
+            HTTP_REQUEST_DB_SECONDS.observe(db_time[0], method=method, route=route)
+            _request_db_time.reset(token)
+            _request_scope.reset(scope_token)
@@ -0,0 +1,238 @@
+import asyncio
+import os
+import re
+from datetime import date
+from typing import Iterable, List
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from ..config.database import engine
+from ..model.featureclick import FeatureClick, CLICKS_PARTITIONED
+
+
+# Load environment variables
+load_dotenv()
+
+# How many upcoming months always have a partition ready
+CLICKS_PARTITION_MONTHS_AHEAD = int(os.getenv("CLICKS_PARTITION_MONTHS_AHEAD", "3"))
+# Keep this many months (current month included); 0 keeps everything
+CLICKS_RETENTION_MONTHS = int(os.getenv("CLICKS_RETENTION_MONTHS", "0"))
+# "detach" keeps old partitions as standalone archive tables, "drop" deletes them
+CLICKS_RETENTION_MODE = os.getenv("CLICKS_RETENTION_MODE", "detach")
+# Maintenance loop interval in the web process
+CLICKS_PARTITION_CHECK_S = int(os.getenv("CLICKS_PARTITION_CHECK_S", "21600"))
+
+TABLE = FeatureClick.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+# Advisory lock key: one maintenance pass at a time across workers and manage.py
+_MAINTENANCE_LOCK = 0x66635F70  # "fc_p"
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month ``months`` after ``month``."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def month_range(first_month: date, last_month: date) -> List[date]:
+    """Month starts from first_month through last_month, inclusive."""
+    months = []
+    month = month_start(first_month)
+    while month <= last_month:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def partitions_enabled(conn: AsyncConnection) -> bool:
+    return CLICKS_PARTITIONED and conn.dialect.name == "postgresql"
+
+
+async def list_partitions(conn: AsyncConnection) -> List[date]:
+    """Months that currently have a partition attached."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": TABLE},
+    )
+    months = []
+    for (name,) in result.all():
+        match = _PARTITION_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+async def ensure_partitions(conn: AsyncConnection, months: Iterable[date]) -> List[str]:
+    """Create the given monthly partitions plus a default partition for rows
+    outside every range. Returns the partitions created.
+
+    Runs inside the caller's transaction; each CREATE uses a savepoint so a
+    month that conflicts with rows already in the default partition is
+    reported and skipped instead of aborting the whole run.
+    """
+    existing = set(await list_partitions(conn))
+    created = []
+
+    await conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+            f"PARTITION OF {TABLE} DEFAULT"
+        )
+    )
+
+    for month in sorted(set(months) - existing):
+        name = partition_name(month)
+        upper = add_months(month, 1)
+        try:
+            async with conn.begin_nested():
+                await conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                        f"TO ('{upper.isoformat()} 00:00:00+00')"
+                    )
+                )
+            created.append(name)
+        except DBAPIError as e:
+            print(f"⚠️ Could not create partition {name}: {e.orig}")
+    return created
+
+
+async def ensure_upcoming_partitions(conn: AsyncConnection) -> List[str]:
+    """Current month through CLICKS_PARTITION_MONTHS_AHEAD months ahead."""
+    this_month = month_start(date.today())
+    last_month = add_months(this_month, CLICKS_PARTITION_MONTHS_AHEAD)
+    return await ensure_partitions(conn, month_range(this_month, last_month))
+
+
+async def apply_retention(
+    conn: AsyncConnection, keep_months: int, mode: str = "detach"
+) -> List[str]:
+    """Detach or drop partitions older than ``keep_months`` months.
+
+    Detached partitions stay in the database as ``<name>_archived`` tables
+    (for later export) without foreign keys, so they never block changes to
+    the user table; dropped ones are gone. Returns the affected names.
+    """
+    if keep_months <= 0:
+        return []
+    if mode not in ("detach", "drop"):
+        raise ValueError(f"Retention mode must be 'detach' or 'drop', got {mode!r}")
+
+    cutoff = add_months(month_start(date.today()), -(keep_months - 1))
+    affected = []
+    for month in await list_partitions(conn):
+        if month >= cutoff:
+            continue
+        name = partition_name(month)
+        if mode == "drop":
+            await conn.execute(text(f"DROP TABLE {name}"))
+        else:
+            await conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            await conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_archived"))
+            foreign_keys = await conn.execute(
+                text(
+                    "SELECT conname FROM pg_constraint "
+                    "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+                ),
+                {"table": f"{name}_archived"},
+            )
+            for (constraint,) in foreign_keys.all():
+                await conn.execute(
+                    text(f'ALTER TABLE {name}_archived DROP CONSTRAINT "{constraint}"')
+                )
+        affected.append(name)
+    return affected
+
+
+async def lock_maintenance(conn: AsyncConnection, wait: bool = True) -> bool:
+    """Take the maintenance lock until the transaction ends. With ``wait``
+    false, returns False at once if another process holds it."""
+    function = "pg_advisory_xact_lock" if wait else "pg_try_advisory_xact_lock"
+    result = await conn.execute(
+        text(f"SELECT {function}(:key)"), {"key": _MAINTENANCE_LOCK}
+    )
+    return wait or bool(result.scalar())
+
+
+async def maintain_partitions() -> None:
+    """One maintenance pass: upcoming partitions and retention.
+
+    Every worker runs the loop; whichever takes the lock first does the
+    pass and the others skip it, so the DDL never runs concurrently.
+    """
+    async with engine.begin() as conn:
+        if not partitions_enabled(conn):
+            return
+        if not await lock_maintenance(conn, wait=False):
+            return
+        created = await ensure_upcoming_partitions(conn)
+        removed = await apply_retention(
+            conn, CLICKS_RETENTION_MONTHS, CLICKS_RETENTION_MODE
+        )
+    if created or removed:
+        print(f"🗓️ Partitions created: {created}, retired: {removed}")
+
+
+async def partition_maintenance_loop() -> None:
+    """Background task started from the startup hook."""
+    while True:
+        try:
+            await maintain_partitions()
+        except Exception as e:
+            print(f"❌ Partition maintenance failed: {e}")
+        await asyncio.sleep(CLICKS_PARTITION_CHECK_S)
+
+
+async def convert_to_partitioned(conn: AsyncConnection) -> int:
+    """Move an existing plain feature_clicks table into the partitioned layout.
+
+    The old table is renamed, the partitioned table is created from the
+    model, partitions covering all existing rows are added and the rows are
+    copied over. Expects the compact layout (``manage.py compact-clicks``).
+    Runs in the caller's transaction. Returns rows moved.
+    """
+    legacy = f"{TABLE}_legacy"
+    await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+    # Index and PK names are schema-wide, free them for the new table
+    await conn.execute(
+        text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {TABLE}_pkey TO {legacy}_pkey")
+    )
+    for index in FeatureClick.__table__.indexes:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+    await conn.run_sync(FeatureClick.__table__.create)
+
+    # Partitions only for months that actually have clicks, plus upcoming ones
+    result = await conn.execute(
+        text(
+            "SELECT DISTINCT CAST(date_trunc('month', timestamp AT TIME ZONE 'UTC') "
+            f"AS date) FROM {legacy} WHERE timestamp IS NOT NULL"
+        )
+    )
+    await ensure_partitions(conn, [row[0] for row in result.all()])
+    await ensure_upcoming_partitions(conn)
+
+    moved = await conn.execute(
+        text(
+            f"INSERT INTO {TABLE} (id, user_id, timestamp, feature_id, age_bucket, gender) "
+            f"SELECT id, user_id, COALESCE(timestamp, now()), feature_id, age_bucket, gender "
+            f"FROM {legacy}"
+        )
+    )
+    await conn.execute(text(f"DROP TABLE {legacy}"))
+    return moved.rowcount
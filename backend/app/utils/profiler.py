@@ -0,0 +1,145 @@
+import asyncio
+import os
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from sqlalchemy import event
+from .metrics import current_route
+
+
+# Load environment variables
+load_dotenv()
+
+# Statements slower than this are logged and kept (0 = profiler off)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+# Fraction of slow SELECTs that are re-run under EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+# Slow queries kept for /admin/slow-queries (oldest are dropped)
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+# Parameters and SQL are cut to this many characters in the log
+SLOW_QUERY_MAX_TEXT = 2000
+
+# Row-locking reads: re-running them would wait on and then take the
+# original statement's locks (bump_sketches runs one per ingest flush)
+_LOCKING_CLAUSE = re.compile(
+    r"\bFOR\s+(NO\s+KEY\s+UPDATE|KEY\s+SHARE|UPDATE|SHARE)\b", re.IGNORECASE
+)
+
+
+def _truncate(value: str) -> str:
+    if len(value) <= SLOW_QUERY_MAX_TEXT:
+        return value
+    return value[:SLOW_QUERY_MAX_TEXT] + f"... ({len(value)} chars)"
+
+
+class SlowQueryProfiler:
+    """Logs statements over a latency threshold and samples their plans.
+
+    A sampled slow SELECT (not a locking one) is executed again on a separate pooled connection
+    with ``EXPLAIN (ANALYZE, BUFFERS)`` (``EXPLAIN QUERY PLAN`` on SQLite),
+    after the original statement has finished. At most one EXPLAIN runs at
+    a time per engine, so a burst of slow queries cannot double the
+    database load. Plans come from the engine that ran the statement (the
+    primary or the analytics replica). Entries live in a per-process ring
+    buffer.
+    """
+
+    def __init__(self, threshold_ms: float, explain_rate: float, size: int):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.entries: deque = deque(maxlen=size)
+        # Engines with an EXPLAIN in progress
+        self._explaining: set = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def install(self, engine) -> None:
+        """Attach to an async engine (no-op when the profiler is off)."""
+        if not self.enabled:
+            return
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            context._slow_query_started = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - context._slow_query_started
+            # Our own EXPLAIN re-runs are not slow queries of their own
+            if elapsed >= self.threshold and not statement.startswith("EXPLAIN"):
+                self.record(engine, statement, parameters, elapsed, executemany)
+
+    def record(
+        self, engine, statement: str, parameters, elapsed: float, executemany: bool
+    ):
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "route": current_route(),
+            "statement": _truncate(statement),
+            "parameters": _truncate(repr(parameters)),
+            "plan": None,
+        }
+        self.entries.append(entry)
+        print(
+            f"🐢 Slow query {entry['duration_ms']} ms"
+            f" [{entry['route'] or 'no request'}]: {' '.join(statement.split())[:500]}"
+            f" | params={entry['parameters'][:500]}"
+        )
+
+        # Plans only for plain reads: EXPLAIN ANALYZE really executes the statement
+        if (
+            executemany
+            or engine in self._explaining
+            or statement.lstrip()[:6].upper() != "SELECT"
+            or _LOCKING_CLAUSE.search(statement)
+            or random.random() >= self.explain_rate
+        ):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explaining.add(engine)
+        task = loop.create_task(self._explain(engine, entry, statement, parameters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(
+        self, engine, entry: Dict[str, Any], statement: str, parameters
+    ) -> None:
+        try:
+            async with engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+                else:
+                    prefix = "EXPLAIN QUERY PLAN "
+                result = await conn.exec_driver_sql(prefix + statement, parameters)
+                # Plan text is the last column (SQLite also returns node ids)
+                entry["plan"] = [str(row[-1]) for row in result.all()]
+                await conn.rollback()
+        except Exception as exc:
+            entry["plan"] = [f"EXPLAIN failed: {exc!r}"]
+            print(f"⚠️  Could not capture plan for slow query: {exc!r}")
+        finally:
+            self._explaining.discard(engine)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Captured slow queries, newest first."""
+        return list(reversed(self.entries))
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+slow_query_profiler = SlowQueryProfiler(
+    SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_LOG_SIZE
+)
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+from typing import Any, Callable, Dict
+import brotli
+import orjson
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+# content-coding -> ETag suffix (each representation gets its own strong tag)
+_ETAG_SUFFIX = {None: "", "br": "-br", "gzip": "-gz"}
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header allows ``coding`` (q=0 means no)."""
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class EncodedJSON:
+    """A JSON payload serialized once, with a content hash and lazily built
+    compressed variants, so cached results are never re-encoded."""
+
+    __slots__ = ("payload", "body", "digest", "_compressed")
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+        self.body = orjson.dumps(payload)
+        self.digest = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self._compressed: Dict[str, bytes] = {}
+
+    def etag(self, coding: str | None = None) -> str:
+        return f'"{self.digest}{_ETAG_SUFFIX[coding]}"'
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """If-None-Match check against any representation of this body."""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            tag = tag.removeprefix("W/").strip('"')
+            if tag.partition("-")[0] == self.digest:
+                return True
+        return False
+
+    def coding(self, accept_encoding: str) -> str | None:
+        """Best content-coding for the client's Accept-Encoding: br, then
+        gzip, then none. Cheap: nothing is compressed here."""
+        if len(self.body) < COMPRESS_MIN_BYTES:
+            return None
+        for coding in ("br", "gzip"):
+            if _accepts(accept_encoding, coding):
+                return coding
+        return None
+
+    def encoded_body(self, coding: str | None) -> bytes:
+        """Body in ``coding``, compressed on first use and kept."""
+        if coding is None:
+            return self.body
+        if coding not in self._compressed:
+            if coding == "br":
+                data = brotli.compress(self.body, quality=5)
+            else:
+                data = gzip.compress(self.body, compresslevel=6)
+            self._compressed[coding] = data
+        return self._compressed[coding]
+
+
+def conditional_json(request: Request, encoded: EncodedJSON) -> Response:
+    """JSON response with a strong ETag, 304 on a matching If-None-Match and
+    br/gzip content-coding when the client accepts it.
+
+    ``no-cache`` lets browsers keep the body but revalidate on every use,
+    so a changed dashboard is never served stale.
+    """
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    coding = encoded.coding(request.headers.get("accept-encoding", ""))
+    headers["ETag"] = encoded.etag(coding)
+
+    # Revalidations never pay for compression
+    if encoded.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(
+        content=encoded.encoded_body(coding), media_type="application/json", headers=headers
+    )
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """StreamingResponse that calls ``release`` once sending is over, however
+    it ends (done, failed or client gone), e.g. to free a limiter slot."""
+
+    def __init__(self, *args, release: Callable[[], None], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
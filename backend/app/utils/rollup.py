@@ -0,0 +1,116 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timezone
+from typing import TYPE_CHECKING, Any, Dict, List
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from ..config.database import dialect_insert
+from ..model.clickrollup import DailyClickRollup
+from ..model.feature import Feature
+from ..model.featureclick import FeatureClick
+
+if TYPE_CHECKING:
+    from .archive import ClickArchive  # imports this module
+
+ROLLUP_KEY = ("day", "feature_name", "age_bucket", "gender")
+
+
+def utc_start(day: date) -> datetime:
+    """Midnight UTC at the start of ``day``."""
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+def utc_day(column, dialect_name: str):
+    """SQL expression for the UTC calendar day of a timestamp column."""
+    if dialect_name == "sqlite":
+        return func.date(column)
+    return cast(func.timezone("UTC", column), Date)
+
+
+async def bump_rollup(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Add freshly ingested click rows to the daily rollup (caller commits).
+
+    Rows must carry ``age_bucket`` and ``gender`` of the clicking user.
+    """
+    counts = Counter(
+        (
+            row["timestamp"].astimezone(timezone.utc).date(),
+            row["feature_name"],
+            row["age_bucket"],
+            row["gender"],
+        )
+        for row in rows
+    )
+    # Sorted keys keep row lock order stable between concurrent flushes
+    values = [
+        {**dict(zip(ROLLUP_KEY, key)), "clicks": clicks}
+        for key, clicks in sorted(counts.items())
+    ]
+
+    stmt = dialect_insert(db.get_bind().dialect.name, DailyClickRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={"clicks": DailyClickRollup.clicks + stmt.excluded.clicks},
+    )
+    await db.execute(stmt)
+
+
+async def rebuild_rollup(conn: AsyncConnection, since: date | None = None) -> int:
+    """Recompute the rollup table from raw clicks (backfill), keyed by the
+    demographics stored on each click.
+
+    With ``since`` (the archive boundary) only days from then on are
+    rebuilt; earlier rollup rows are kept, their clicks are archived.
+    """
+    day = utc_day(FeatureClick.timestamp, conn.dialect.name)
+    source = (
+        select(
+            day,
+            Feature.name,
+            FeatureClick.age_bucket,
+            FeatureClick.gender,
+            func.count(FeatureClick.id),
+        )
+        .join(Feature)
+        .group_by(day, Feature.name, FeatureClick.age_bucket, FeatureClick.gender)
+    )
+
+    stale = delete(DailyClickRollup)
+    if since is not None:
+        source = source.where(FeatureClick.timestamp >= utc_start(since))
+        stale = stale.where(DailyClickRollup.day >= since)
+    await conn.execute(stale)
+    await conn.execute(
+        insert(DailyClickRollup).from_select([*ROLLUP_KEY, "clicks"], source)
+    )
+    result = await conn.execute(select(func.count()).select_from(DailyClickRollup))
+    return result.scalar()
+
+
+async def rebuild_archived_rollup(conn: AsyncConnection, archive: "ClickArchive") -> int:
+    """Recompute the rollup rows of archived days from the archive files
+    (their raw clicks are no longer in feature_clicks)."""
+    boundary = archive.boundary()
+    if boundary is None:
+        return 0
+    await conn.execute(delete(DailyClickRollup).where(DailyClickRollup.day < boundary))
+    names = dict((await conn.execute(select(Feature.id, Feature.name))).all())
+    written = 0
+    for day in await asyncio.to_thread(archive.archived_days):
+        if day >= boundary:
+            continue
+        counts: Counter = Counter()
+        for feature_id, age, gender, _, clicks in await asyncio.to_thread(
+            archive.day_groups, day
+        ):
+            counts[(day, names[feature_id], age, gender)] += clicks
+        if counts:
+            await conn.execute(
+                insert(DailyClickRollup),
+                [
+                    {**dict(zip(ROLLUP_KEY, key)), "clicks": clicks}
+                    for key, clicks in counts.items()
+                ],
+            )
+            written += len(counts)
+    return written
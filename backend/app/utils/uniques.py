@@ -0,0 +1,198 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, timezone
+from typing import Any, Dict, List
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from ..config.database import dialect_insert
+from ..model.feature import Feature
+from ..model.featureclick import FeatureClick
+from ..model.usersketch import DailyUserSketch
+from .archive import ClickArchive
+from .buckets import bucket_start
+from .demographics import AGE_BUCKETS
+from .hll import EMPTY_SKETCH, HLL_RELATIVE_ERROR, HyperLogLog, merge_sketches
+from .rollup import ROLLUP_KEY, utc_day, utc_start
+
+# Sketches written per INSERT while rebuilding
+SKETCH_REBUILD_BATCH = 1000
+
+_KEY_COLUMNS = [getattr(DailyUserSketch, name) for name in ROLLUP_KEY]
+
+
+async def bump_sketches(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Add the users of freshly ingested click rows to the daily sketches
+    (caller commits). Rows must carry ``age_bucket`` and ``gender``.
+
+    Sketches are read-modify-write: missing rows are created empty, then all
+    touched rows are locked in key order (FOR UPDATE, a no-op on SQLite)
+    so concurrent flushes from other workers cannot lose each other's users.
+    """
+    users: Dict[tuple, set] = defaultdict(set)
+    for row in rows:
+        key = (
+            row["timestamp"].astimezone(timezone.utc).date(),
+            row["feature_name"],
+            row["age_bucket"],
+            row["gender"],
+        )
+        users[key].add(str(row["user_id"]))
+    keys = sorted(users)
+
+    stmt = dialect_insert(db.get_bind().dialect.name, DailyUserSketch).values(
+        [{**dict(zip(ROLLUP_KEY, key)), "sketch": EMPTY_SKETCH} for key in keys]
+    )
+    await db.execute(stmt.on_conflict_do_nothing(index_elements=list(ROLLUP_KEY)))
+
+    result = await db.execute(
+        select(*_KEY_COLUMNS, DailyUserSketch.sketch)
+        .where(tuple_(*_KEY_COLUMNS).in_(keys))
+        .order_by(*_KEY_COLUMNS)
+        .with_for_update()
+    )
+    changed = []
+    for *key, blob in result.all():
+        sketch = HyperLogLog.from_bytes(blob)
+        # Repeat clicks by the same users mostly leave the sketch as it was
+        if sketch.update(users[tuple(key)]):
+            changed.append({**dict(zip(ROLLUP_KEY, key)), "sketch": sketch.to_bytes()})
+    if changed:
+        await db.execute(update(DailyUserSketch), changed)
+
+
+async def rebuild_sketches(conn: AsyncConnection, since: date | None = None) -> int:
+    """Recompute the daily sketches from raw clicks (backfill), keyed by the
+    demographics stored on each click.
+
+    Distinct (key, user) pairs are streamed in key order, so only one sketch
+    is held in memory at a time. With ``since`` (the archive boundary) only
+    days from then on are rebuilt.
+    """
+    day = utc_day(FeatureClick.timestamp, conn.dialect.name)
+    age, gender = FeatureClick.age_bucket, FeatureClick.gender
+    source = (
+        select(day, Feature.name, age, gender, FeatureClick.user_id)
+        .join(Feature)
+        .group_by(day, Feature.name, age, gender, FeatureClick.user_id)
+        .order_by(day, Feature.name, age, gender)
+    )
+
+    stale = delete(DailyUserSketch)
+    if since is not None:
+        source = source.where(FeatureClick.timestamp >= utc_start(since))
+        stale = stale.where(DailyUserSketch.day >= since)
+    await conn.execute(stale)
+    written = 0
+    pending: List[Dict[str, Any]] = []
+    current_key, sketch = None, None
+
+    async def flush():
+        nonlocal written
+        if pending:
+            await conn.execute(insert(DailyUserSketch), pending)
+            written += len(pending)
+            pending.clear()
+
+    result = await conn.stream(source.execution_options(yield_per=10_000))
+    async for partition in result.partitions():
+        for day, *key, user_id in partition:
+            # SQLite's date() comes back as text
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            key = (day, *key)
+            if key != current_key:
+                if sketch is not None:
+                    pending.append(
+                        {**dict(zip(ROLLUP_KEY, current_key)), "sketch": sketch.to_bytes()}
+                    )
+                current_key, sketch = key, HyperLogLog()
+            sketch.add(str(user_id))
+        if len(pending) >= SKETCH_REBUILD_BATCH:
+            await flush()
+    if sketch is not None:
+        pending.append({**dict(zip(ROLLUP_KEY, current_key)), "sketch": sketch.to_bytes()})
+    await flush()
+    return written
+
+
+async def rebuild_archived_sketches(conn: AsyncConnection, archive: ClickArchive) -> int:
+    """Recompute the daily sketches of archived days from the archive files
+    (their raw clicks are no longer in feature_clicks)."""
+    boundary = archive.boundary()
+    if boundary is None:
+        return 0
+    await conn.execute(delete(DailyUserSketch).where(DailyUserSketch.day < boundary))
+    names = dict((await conn.execute(select(Feature.id, Feature.name))).all())
+    written = 0
+    for day in await asyncio.to_thread(archive.archived_days):
+        if day >= boundary:
+            continue
+        sketches: Dict[tuple, HyperLogLog] = defaultdict(HyperLogLog)
+        for feature_id, age, gender, user_id, _ in await asyncio.to_thread(
+            archive.day_groups, day
+        ):
+            sketches[(day, names[feature_id], age, gender)].add(user_id)
+        if sketches:
+            await conn.execute(
+                insert(DailyUserSketch),
+                [
+                    {**dict(zip(ROLLUP_KEY, key)), "sketch": sketch.to_bytes()}
+                    for key, sketch in sketches.items()
+                ],
+            )
+            written += len(sketches)
+    return written
+
+
+def _approximate(users: float) -> Dict[str, int]:
+    """Rounded estimate with a ~95% (2 sigma) error margin."""
+    return {
+        "users": round(users),
+        "margin": round(users * 2 * HLL_RELATIVE_ERROR),
+    }
+
+
+async def sketch_unique_users(
+    db: AsyncSession,
+    s_date: date,
+    e_date: date,
+    age_group: str | None,
+    gender: str | None,
+    granularity: str,
+) -> Dict[str, Any]:
+    """Unique users per bucket per feature, and per feature over the whole
+    range, by merging daily sketches (day granularity or coarser)."""
+    filters = [DailyUserSketch.day >= s_date, DailyUserSketch.day <= e_date]
+    if age_group in AGE_BUCKETS:
+        filters.append(DailyUserSketch.age_bucket == age_group)
+    if gender:
+        filters.append(DailyUserSketch.gender == gender)
+
+    result = await db.execute(
+        select(
+            DailyUserSketch.day, DailyUserSketch.feature_name, DailyUserSketch.sketch
+        ).where(*filters)
+    )
+    buckets: Dict[tuple, List[bytes]] = defaultdict(list)
+    for day, feature, blob in result.all():
+        buckets[(bucket_start(day, granularity), feature)].append(blob)
+
+    # Totals merge the bucket unions, not every daily sketch again
+    by_feature: Dict[str, List[bytes]] = defaultdict(list)
+    series = []
+    for (bucket, feature), blobs in sorted(buckets.items()):
+        merged = merge_sketches(blobs)
+        by_feature[feature].append(merged.to_bytes())
+        series.append(
+            {"date": bucket.isoformat(), "feature": feature, **_approximate(merged.estimate())}
+        )
+    totals = [
+        {"feature": feature, **_approximate(merge_sketches(blobs).estimate())}
+        for feature, blobs in by_feature.items()
+    ]
+    return {
+        "exact": False,
+        "relative_error": round(HLL_RELATIVE_ERROR, 4),
+        "totals": totals,
+        "series": series,
+    }
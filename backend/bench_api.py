@@ -0,0 +1,282 @@
+"""
+API Benchmark for the ingest (single and batch), analytics and login endpoints.
+
+Drives the real FastAPI app, either in-process (default, through httpx's
+ASGI transport with the startup/shutdown hooks run) or over HTTP against a
+running server (--url). The database is whatever DATABASE_URL points at:
+local PostgreSQL, or SQLite as a stand-in. Seed it first for realistic
+volumes, e.g. `python seed.py --users 20000 --clicks 2000000 --days 365`.
+
+For every scenario it records throughput and p50/p95/p99 latency and
+writes everything to a JSON file, so runs can be compared across commits.
+
+Analytics scenarios measure the query path: in-process runs turn the result
+cache off (--cache keeps it), and each request moves its start date back by
+0..--analytics-variants-1 days, so concurrent requests are not coalesced
+into one query (against --url, the server's cache still applies to repeats).
+
+Usage:
+    python bench_api.py --requests 500 --concurrency 10 --out bench_api.json
+    python bench_api.py --only analytics_30d --only track --only track_batch
+    python bench_api.py --cache --analytics-variants 1   # cache hits and coalescing
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta, timezone
+import httpx
+
+BENCH_USER = {
+    "username": "bench_user",
+    "email": "bench_user@example.com",
+    "password": "bench-password",
+    "age": 30,
+    "gender": "Female",
+}
+
+FEATURE_NAMES = [
+    "date_filter",
+    "age_filter",
+    "gender_filter",
+    "bar_chart_click",
+    "line_chart_click",
+    "export_data",
+    "refresh_button",
+]
+
+# (days, extra params) per analytics scenario; granularity as the dashboard picks it
+ANALYTICS_RANGES = {"7d": 7, "30d": 30, "365d": 365}
+ANALYTICS_FILTERS = {
+    "": {},
+    "_age": {"ageGroup": "18-40"},
+    "_gender": {"gender": "Female"},
+    "_age_gender": {"ageGroup": "18-40", "gender": "Female"},
+}
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": ms(statistics.fmean(values)) if values else 0.0,
+            "p50": ms(percentile(values, 50)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "max": ms(values[-1]) if values else 0.0,
+        },
+    }
+
+
+async def run_scenario(client, make_request, total: int, concurrency: int, warmup: int):
+    """Fire ``total`` requests from ``concurrency`` workers and time each one."""
+    for i in range(warmup):
+        await make_request(client, i)
+
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def get_token(client) -> str:
+    # 400 means the bench user already exists
+    await client.post("/users/", json=BENCH_USER)
+    response = await client.post(
+        "/users/login",
+        json={"username": BENCH_USER["username"], "password": BENCH_USER["password"]},
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def build_scenarios(headers: dict, batch_size: int, analytics_variants: int) -> dict:
+    today = date.today()
+
+    async def login(client, i):
+        return await client.post(
+            "/users/login",
+            json={"username": BENCH_USER["username"], "password": BENCH_USER["password"]},
+        )
+
+    async def track(client, i):
+        return await client.post(
+            "/track/",
+            json={"feature_name": FEATURE_NAMES[i % len(FEATURE_NAMES)]},
+            headers=headers,
+        )
+
+    async def track_batch(client, i):
+        return await client.post(
+            "/track/batch",
+            json={
+                "events": [
+                    {"feature_name": FEATURE_NAMES[(i + n) % len(FEATURE_NAMES)]}
+                    for n in range(batch_size)
+                ]
+            },
+            headers=headers,
+        )
+
+    scenarios = {"login": login, "track": track, "track_batch": track_batch}
+
+    for range_name, days in ANALYTICS_RANGES.items():
+        granularity = "month" if days > 366 else "week" if days > 92 else "day"
+        for filter_name, extra in ANALYTICS_FILTERS.items():
+            params = {"endDate": today.isoformat(), "granularity": granularity, **extra}
+
+            async def analytics(client, i, days=days, params=params):
+                start = today - timedelta(days=days + i % analytics_variants)
+                return await client.get(
+                    "/track/analytics",
+                    params={"startDate": start.isoformat(), **params},
+                    headers=headers,
+                )
+
+            scenarios[f"analytics_{range_name}{filter_name}"] = analytics
+    return scenarios
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        app = None
+        target = args.url
+    else:
+        if not args.cache:
+            os.environ.setdefault("ANALYTICS_CACHE_SIZE", "0")
+        import main
+
+        app = main.app
+        await app.router.startup()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60
+        )
+        target = f"in-process ({main.engine.dialect.name})"
+
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": target,
+        "python": platform.python_version(),
+        "settings": {
+            "requests": args.requests,
+            "login_requests": args.login_requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "batch_size": args.batch_size,
+            "analytics_variants": args.analytics_variants,
+            "env": {
+                key: os.environ[key]
+                for key in sorted(os.environ)
+                if key.startswith(("DB_", "ANALYTICS_", "INGEST_", "HASH_", "CLICKS_"))
+                and not key.endswith("_URL")  # may hold credentials
+            },
+        },
+        "scenarios": {},
+    }
+
+    print(f"🏁 Benchmarking {target}")
+    try:
+        async with client:
+            token = await get_token(client)
+            scenarios = build_scenarios(
+                {"Authorization": f"Bearer {token}"},
+                args.batch_size,
+                max(1, args.analytics_variants),
+            )
+            for name, make_request in scenarios.items():
+                if args.only and name not in args.only:
+                    continue
+                total = args.login_requests if name == "login" else args.requests
+                summary = await run_scenario(
+                    client, make_request, total, args.concurrency, args.warmup
+                )
+                results["scenarios"][name] = summary
+                latency = summary["latency_ms"]
+                print(
+                    f"   {name:<28} {summary['throughput_rps']:>9.1f} req/s   "
+                    f"p50 {latency['p50']:>8.2f}  p95 {latency['p95']:>8.2f}  "
+                    f"p99 {latency['p99']:>8.2f} ms   errors {summary['errors']}"
+                )
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard API benchmark")
+    parser.add_argument("--url", help="benchmark a running server instead of in-process")
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument(
+        "--login-requests", type=int, default=50, help="login is Argon2-bound"
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument(
+        "--batch-size", type=int, default=50, help="events per /track/batch request"
+    )
+    parser.add_argument(
+        "--analytics-variants",
+        type=int,
+        default=50,
+        help="distinct start dates per analytics scenario (1 = identical requests)",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="keep the analytics result cache (in-process)"
+    )
+    parser.add_argument(
+        "--only", action="append", help="scenario name (repeatable), e.g. track"
+    )
+    parser.add_argument("--out", default="bench_api.json")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,182 @@
+"""
+Index Benchmark for feature_clicks (PostgreSQL only).
+
+1. Builds a throwaway `bench` schema with users and N synthetic clicks
+2. Runs the analytics query with EXPLAIN (ANALYZE, BUFFERS) on:
+   - no indexes (sequential scans)
+   - the btree indexes declared on FeatureClick
+   - a BRIN index on timestamp only
+3. Prints plans + timings and writes them to a JSON file
+
+Usage:
+    python bench_indexes.py --rows 10000000 --out bench_indexes.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+from app.config.database import engine
+
+FEATURE_NAMES = [
+    "date_filter",
+    "age_filter",
+    "gender_filter",
+    "bar_chart_click",
+    "line_chart_click",
+    "export_data",
+    "refresh_button",
+]
+
+# Same definitions as FeatureClick.__table_args__, on the bench tables
+INDEX_SETS = {
+    "none": [],
+    "btree": [
+        "CREATE INDEX bench_clicks_ts_feature ON bench.feature_clicks "
+        "(timestamp, feature_id) INCLUDE (user_id, age_bucket, gender)",
+        "CREATE INDEX bench_clicks_user_id ON bench.feature_clicks (user_id)",
+    ],
+    "brin": [
+        "CREATE INDEX bench_clicks_ts_brin ON bench.feature_clicks "
+        "USING brin (timestamp)",
+    ],
+}
+
+INDEX_NAMES = (
+    "bench_clicks_ts_feature",
+    "bench_clicks_user_id",
+    "bench_clicks_ts_brin",
+)
+
+# Mirrors the raw analytics query in app/utils/analytics.py
+ANALYTICS_SQL = """
+SELECT CAST(c.timestamp AS DATE), c.feature_id, count(*)
+FROM bench.feature_clicks c
+WHERE c.timestamp >= '{start}' AND c.timestamp <= '{end} 23:59:59.999999' {extra}
+GROUP BY CAST(c.timestamp AS DATE), c.feature_id
+ORDER BY CAST(c.timestamp AS DATE)
+"""
+
+QUERIES = {
+    "last_7_days": (7, ""),
+    "last_30_days": (30, ""),
+    "last_30_days_18_40_female": (
+        30,
+        "AND c.age_bucket = '18-40' AND c.gender = 'Female'",
+    ),
+    "last_365_days": (365, ""),
+}
+
+
+async def build_dataset(conn, rows: int, users: int, days: int):
+    print(f"🌱 Generating {users} users and {rows} clicks over {days} days...")
+    started = time.perf_counter()
+    await conn.exec_driver_sql("DROP SCHEMA IF EXISTS bench CASCADE")
+    await conn.exec_driver_sql("CREATE SCHEMA bench")
+    # Same column layout as the models (uuid keys, integer feature ids)
+    await conn.exec_driver_sql(
+        'CREATE TABLE bench."user" (id uuid PRIMARY KEY, age int, gender text)'
+    )
+    await conn.exec_driver_sql(
+        "CREATE TABLE bench.features (id serial PRIMARY KEY, name text UNIQUE)"
+    )
+    await conn.exec_driver_sql(
+        "CREATE TABLE bench.feature_clicks (id uuid PRIMARY KEY, user_id uuid, "
+        "timestamp timestamptz, feature_id int, age_bucket text, gender text)"
+    )
+    await conn.exec_driver_sql(
+        f"""INSERT INTO bench."user"
+        SELECT md5('u' || g)::uuid, 15 + (g % 46), (ARRAY['Male','Female','Other'])[1 + g % 3]
+        FROM generate_series(1, {users}) g"""
+    )
+    features = ",".join(f"('{name}')" for name in FEATURE_NAMES)
+    await conn.exec_driver_sql(f"INSERT INTO bench.features (name) VALUES {features}")
+    # Timestamps grow with g, like an append-only event log
+    await conn.exec_driver_sql(
+        f"""INSERT INTO bench.feature_clicks
+        SELECT md5(g::text)::uuid,
+               md5('u' || (1 + floor(random() * {users}))::int)::uuid,
+               now() - interval '{days} days' + (g::float8 / {rows}) * interval '{days} days',
+               1 + floor(random() * {len(FEATURE_NAMES)})::int
+        FROM generate_series(1, {rows}) g"""
+    )
+    # Demographics copied from the user, as ingest stores them
+    await conn.exec_driver_sql(
+        """UPDATE bench.feature_clicks c
+        SET age_bucket = CASE WHEN u.age < 18 THEN '<18'
+                              WHEN u.age <= 40 THEN '18-40' ELSE '>40' END,
+            gender = u.gender
+        FROM bench."user" u WHERE u.id = c.user_id"""
+    )
+    await conn.exec_driver_sql("ANALYZE bench.feature_clicks")
+    await conn.exec_driver_sql('ANALYZE bench."user"')
+    print(f"   ✅ Done in {time.perf_counter() - started:.1f}s")
+
+
+async def explain(conn, sql: str) -> dict:
+    result = await conn.exec_driver_sql(
+        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql
+    )
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+    text = await conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + sql)
+    return {
+        "execution_ms": plan["Execution Time"],
+        "planning_ms": plan["Planning Time"],
+        "plan": "\n".join(row[0] for row in text.all()),
+    }
+
+
+async def run(rows: int, users: int, days: int, out: str, keep: bool):
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("bench_indexes.py needs a PostgreSQL DATABASE_URL")
+
+    results = {"rows": rows, "users": users, "days": days, "index_sets": {}}
+    today = date.today()
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await build_dataset(conn, rows, users, days)
+
+        for set_name, ddl in INDEX_SETS.items():
+            print(f"\n🗂️  Index set: {set_name}")
+            for name in INDEX_NAMES:
+                await conn.exec_driver_sql(f"DROP INDEX IF EXISTS bench.{name}")
+            started = time.perf_counter()
+            for statement in ddl:
+                await conn.exec_driver_sql(statement)
+            await conn.exec_driver_sql("VACUUM ANALYZE bench.feature_clicks")
+            build_seconds = time.perf_counter() - started
+
+            set_results = {"build_seconds": round(build_seconds, 2), "queries": {}}
+            for query_name, (span, extra) in QUERIES.items():
+                sql = ANALYTICS_SQL.format(
+                    start=today - timedelta(days=span), end=today, extra=extra
+                )
+                # Warm-up run so both sides are measured with a hot cache
+                await conn.exec_driver_sql(sql)
+                measured = await explain(conn, sql)
+                set_results["queries"][query_name] = measured
+                print(f"   {query_name:<28} {measured['execution_ms']:>10.1f} ms")
+            results["index_sets"][set_name] = set_results
+
+        if not keep:
+            await conn.exec_driver_sql("DROP SCHEMA bench CASCADE")
+
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Plans written to {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="feature_clicks index benchmark")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--out", default="bench_indexes.json")
+    parser.add_argument("--keep", action="store_true", help="keep the bench schema")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.users, args.days, args.out, args.keep))
@@ -11,6 +11,8 @@ sys.path.append(os.getcwd())
 from app.config.database import AsyncSessionLocal
 from app.model.featureclick import FeatureClick
 from app.model.user import User
+from app.utils.demographics import age_bucket
+from app.utils.features import feature_registry
 
 
 async def test_persistence():
@@ -51,7 +53,15 @@ async def test_persistence():
         print(f"Using User ID: {user.id}")
 
         # 4. Insert a new Click (Simulate POST /track)
-        new_click = FeatureClick(user_id=user.id, feature_name="debug_test_feature")
+        feature_id = (await feature_registry.ids(["debug_test_feature"]))[
+            "debug_test_feature"
+        ]
+        new_click = FeatureClick(
+            user_id=user.id,
+            feature_id=feature_id,
+            age_bucket=age_bucket(user.age),
+            gender=user.gender,
+        )
         db.add(new_click)
         await db.commit()
         await db.refresh(new_click)
@@ -65,7 +75,7 @@ async def test_persistence():
         query = (
             select(func.count(FeatureClick.id))
             .where(*filters)
-            .where(FeatureClick.feature_name == "debug_test_feature")
+            .where(FeatureClick.feature_id == feature_id)
         )
 
         count_result = await db.execute(query)
@@ -1,14 +1,52 @@
+import time
+
+# Taken before the heavy imports below, for the startup report
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from sqlalchemy import text
 import uvicorn
-from app.config.database import engine, Base
+from app.config.database import (
+    engine,
+    ensure_schema,
+    pool_stats,
+    read_engine,
+    replica_status,
+)
 from app.routes.user import router as user_router
 from app.routes.trck import router as track_router
+from app.routes.admin import router as admin_router
+from app.utils.ingest import click_buffer
+from app.utils.analytics import analytics_flights, analytics_limiter
+from app.utils.auth import hash_pool
+from app.utils.export import export_limiter
+from app.utils.features import feature_registry
+from app.utils.hottier import hot_tier
+from app.utils.live import click_feed
+from app.utils.metrics import APP_STARTUP_SECONDS, MetricsMiddleware, registry
+from app.utils.partitions import (
+    ensure_upcoming_partitions,
+    lock_maintenance,
+    partition_maintenance_loop,
+    partitions_enabled,
+)
+import asyncio
+import os
 from fastapi.middleware.cors import CORSMiddleware
 
+# /health gives up on the database after this long
+HEALTH_DB_TIMEOUT_S = float(os.getenv("HEALTH_DB_TIMEOUT_S", "2"))
+
+# Create tables/indexes from every process on startup (dev). serve.py turns
+# this off; run `python manage.py create-schema` once per deploy instead.
+SCHEMA_ON_STARTUP = os.getenv("SCHEMA_ON_STARTUP", "true").lower() == "true"
+
 app = FastAPI(
     title="Self Visualization",
     description="FastAPI Self Visualization application with MVC structure",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # CORS Configuration
@@ -30,18 +68,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last so it wraps everything, CORS preflights included
+app.add_middleware(MetricsMiddleware)
+
 
 # Include routers
 app.include_router(user_router)
 app.include_router(track_router)
+app.include_router(admin_router)
+
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 
 @app.on_event("startup")
 async def startup():
-    """Create database tables on startup"""
+    """Create database tables (unless done by create-schema) and start the
+    background workers"""
+    started = time.perf_counter()
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created successfully!")
+        partitioned = partitions_enabled(conn)
+        if SCHEMA_ON_STARTUP:
+            await conn.run_sync(ensure_schema)
+            if partitioned:
+                await lock_maintenance(conn)
+                await ensure_upcoming_partitions(conn)
+            print("Database tables created successfully!")
+    await feature_registry.load()
+    await click_buffer.start()
+    await click_feed.start()
+    await hot_tier.start()
+    if partitioned:
+        app.state.partition_task = asyncio.create_task(partition_maintenance_loop())
+    _report_startup(time.perf_counter() - started)
+
+
+def _report_startup(startup_seconds: float) -> None:
+    APP_STARTUP_SECONDS.set(_IMPORT_SECONDS, phase="import")
+    APP_STARTUP_SECONDS.set(startup_seconds, phase="startup")
+    report = f"imports {_IMPORT_SECONDS:.2f}s, startup {startup_seconds:.2f}s"
+    # Set by serve.py: includes interpreter start and worker spawn
+    launched_at = os.getenv("APP_LAUNCHED_AT")
+    if launched_at:
+        total = time.time() - float(launched_at)
+        APP_STARTUP_SECONDS.set(total, phase="total")
+        report = f"{total:.2f}s after launch ({report})"
+    print(f"🚀 Worker {os.getpid()} ready in {report}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush buffered clicks, then close the pools (pooled aiosqlite
+    connections would otherwise keep the process alive)"""
+    await click_buffer.stop()
+    await click_feed.stop()
+    await hot_tier.stop()
+    hash_pool.shutdown()
+    partition_task = getattr(app.state, "partition_task", None)
+    if partition_task:
+        partition_task.cancel()
+    await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
 
 
 @app.get("/")
@@ -49,10 +137,67 @@ async def root():
     return {"message": "Welcome to Self Visualization API"}
 
 
+async def _ping_database() -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
 @app.get("/health")
 async def health_check():
+    """Liveness plus a real round trip to the database."""
+    try:
+        await asyncio.wait_for(_ping_database(), HEALTH_DB_TIMEOUT_S)
+    except Exception as exc:
+        print(f"❌ Health check: database unreachable ({exc!r})")
+        return ORJSONResponse(
+            status_code=503,
+            content={"status": "unhealthy", "database": "unreachable"},
+        )
     return {"status": "healthy", "database": "connected"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint (this worker's counters only)."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/health/pool")
+async def db_pool_stats():
+    return pool_stats()
+
+
+@app.get("/health/replica")
+async def replica_stats():
+    await replica_status.check()
+    return replica_status.stats()
+
+
+@app.get("/health/hot-tier")
+async def hot_tier_stats():
+    return hot_tier.stats()
+
+
+@app.get("/health/live")
+async def live_feed_stats():
+    return {"subscribers": click_feed.subscribers}
+
+
+@app.get("/health/admission")
+async def admission_stats():
+    return {
+        "analytics": {**analytics_limiter.stats(), **analytics_flights.stats()},
+        "export": export_limiter.stats(),
+    }
+
+
+@app.get("/health/hash-pool")
+async def hash_pool_stats():
+    return hash_pool.stats()
+
+
 if __name__ == "__main__":
+    # Development server (one process, auto-reload); production: python serve.py
     uvicorn.run("main:app", host="0.0.0.0", port=9000, reload=True)
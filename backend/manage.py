@@ -0,0 +1,185 @@
+"""
+Maintenance commands.
+
+Usage:
+    python manage.py create-schema     # tables, columns, indexes, partitions (once per deploy)
+    python manage.py backfill-rollup   # rebuild feature_click_daily (after enabling it)
+    python manage.py backfill-sketches # rebuild unique-user sketches (after enabling them)
+    python manage.py backfill-click-demographics  # age bucket + gender onto old clicks
+    python manage.py archive-clicks    # move clicks older than ARCHIVE_AFTER_DAYS to files
+    python manage.py compact-clicks    # feature ids + native uuid keys (PostgreSQL)
+    python manage.py create-indexes    # build declared indexes without blocking writes
+    python manage.py partition-clicks  # convert feature_clicks to monthly partitions
+    python manage.py maintain-partitions  # create upcoming partitions, apply retention
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.schema import CreateIndex
+from app.config.database import engine, Base, add_missing_columns, ensure_schema
+from app.model.featureclick import FeatureClick
+from app.utils.archive import ARCHIVE_AFTER_DAYS, click_archive
+from app.utils.demographics import backfill_click_demographics
+from app.utils.rollup import rebuild_archived_rollup, rebuild_rollup
+from app.utils.uniques import rebuild_archived_sketches, rebuild_sketches
+from app.utils.features import click_storage_compact, compact_click_storage
+from app.utils.partitions import (
+    CLICKS_RETENTION_MODE,
+    CLICKS_RETENTION_MONTHS,
+    apply_retention,
+    convert_to_partitioned,
+    ensure_upcoming_partitions,
+    lock_maintenance,
+    partitions_enabled,
+)
+
+# Import models so Base.metadata knows every table
+from app.model import user, feature, featureclick, clickrollup, usersketch  # noqa: F401
+
+
+async def create_schema():
+    print("🧱 Creating database schema...")
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_schema)
+        if partitions_enabled(conn):
+            await lock_maintenance(conn)
+            created = await ensure_upcoming_partitions(conn)
+            print(f"   Partitions created: {created or 'none'}")
+    print("   ✅ Schema ready")
+
+
+async def _require_click_demographics(conn) -> None:
+    """The rollup and sketches are keyed by the demographics on each click."""
+    missing = await conn.execute(
+        select(FeatureClick.id).where(FeatureClick.age_bucket.is_(None)).limit(1)
+    )
+    if missing.first() is not None:
+        raise SystemExit(
+            "Some clicks have no age bucket yet: run "
+            "`python manage.py backfill-click-demographics` first"
+        )
+
+
+async def backfill_rollup():
+    print("📊 Rebuilding daily rollup from raw clicks and the archive...")
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_schema)
+        await _require_click_demographics(conn)
+        await rebuild_archived_rollup(conn, click_archive)
+        rows = await rebuild_rollup(conn, since=click_archive.boundary())
+    print(f"   ✅ feature_click_daily now has {rows} rows")
+
+
+async def backfill_sketches():
+    print("🔢 Rebuilding unique-user sketches from raw clicks and the archive...")
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_schema)
+        await _require_click_demographics(conn)
+        sketches = await rebuild_sketches(conn, since=click_archive.boundary())
+        sketches += await rebuild_archived_sketches(conn, click_archive)
+    print(f"   ✅ feature_user_sketch_daily now has {sketches} sketches")
+
+
+async def backfill_demographics():
+    print("👥 Copying user age buckets and genders onto clicks...")
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_schema)
+    clicks = await backfill_click_demographics(engine)
+    async with engine.begin() as conn:
+        # Superseded by ix_feature_clicks_timestamp_feature_demographics
+        await conn.exec_driver_sql("DROP INDEX IF EXISTS ix_feature_clicks_timestamp_feature")
+    print(f"   ✅ {clicks} clicks backfilled")
+
+
+async def archive_clicks():
+    if ARCHIVE_AFTER_DAYS <= 0:
+        raise SystemExit("Set ARCHIVE_AFTER_DAYS to the number of days to keep in the database")
+    before = datetime.now(timezone.utc).date() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    print(f"🧊 Archiving clicks before {before} to {click_archive.root}/...")
+    moved = await click_archive.archive(engine, before)
+    print(f"   ✅ {sum(moved.values())} clicks from {len(moved)} days archived")
+
+
+async def compact_clicks():
+    print("🗜️  Compacting feature_clicks storage...")
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise SystemExit(
+                "compact-clicks needs PostgreSQL; recreate SQLite databases with seed.py"
+            )
+        clicks = await compact_click_storage(conn)
+    print(f"   ✅ {clicks} clicks use feature ids and uuid keys")
+
+
+async def create_indexes():
+    print("🗂️  Creating declared indexes...")
+    async with engine.connect() as conn:
+        # CONCURRENTLY cannot run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                ddl = str(
+                    CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect)
+                )
+                if conn.dialect.name == "postgresql":
+                    ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                print(f"   {index.name}")
+                await conn.exec_driver_sql(ddl)
+    print("   ✅ Indexes ready")
+
+
+async def partition_clicks():
+    print("🗓️  Converting feature_clicks to monthly partitions...")
+    async with engine.begin() as conn:
+        if not partitions_enabled(conn):
+            raise SystemExit("Set CLICKS_PARTITIONED=true with a PostgreSQL DATABASE_URL")
+        if not await click_storage_compact(conn):
+            raise SystemExit("Run `python manage.py compact-clicks` first")
+        # The copy below includes columns added since the table was created
+        await conn.run_sync(add_missing_columns)
+        moved = await convert_to_partitioned(conn)
+    print(f"   ✅ Moved {moved} clicks into the partitioned table")
+
+
+async def maintain_partitions():
+    print("🗓️  Partition maintenance...")
+    async with engine.begin() as conn:
+        if not partitions_enabled(conn):
+            raise SystemExit("Set CLICKS_PARTITIONED=true with a PostgreSQL DATABASE_URL")
+        await lock_maintenance(conn)
+        created = await ensure_upcoming_partitions(conn)
+        retired = await apply_retention(
+            conn, CLICKS_RETENTION_MONTHS, CLICKS_RETENTION_MODE
+        )
+    print(f"   ✅ Created: {created or 'none'}")
+    print(f"   ✅ Retired ({CLICKS_RETENTION_MODE}): {retired or 'none'}")
+
+
+COMMANDS = {
+    "create-schema": create_schema,
+    "backfill-rollup": backfill_rollup,
+    "backfill-sketches": backfill_sketches,
+    "backfill-click-demographics": backfill_demographics,
+    "archive-clicks": archive_clicks,
+    "compact-clicks": compact_clicks,
+    "create-indexes": create_indexes,
+    "partition-clicks": partition_clicks,
+    "maintain-partitions": maintain_partitions,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            await COMMANDS[args.command]()
+        finally:
+            # Close pooled connections (aiosqlite threads keep the process alive)
+            await engine.dispose()
+
+    asyncio.run(main())
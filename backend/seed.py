@@ -4,16 +4,41 @@ Complete Reset and Seed Script.
 2. Recreates all tables
 3. Populates dummy data
 ALL IN ONE GO!
+
+Usage:
+    python seed.py                                   # 20 users, 150 clicks (demo)
+    python seed.py --users 50000 --clicks 5000000 --days 365   # scale testing
+
+Data is generated with realistic shapes (popular vs rare features, a
+daily activity curve, quieter weekends, a few very active users) and
+loaded with COPY on PostgreSQL or batched multi-row INSERTs elsewhere.
 """
 
+import argparse
 import asyncio
+import itertools
+import math
 import random
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
-from app.config.database import engine, Base, AsyncSessionLocal
+from sqlalchemy import insert, select, text
+from app.config.database import engine, Base
 from app.model.user import User
+from app.model.feature import Feature
 from app.model.featureclick import FeatureClick
-import uuid
 from app.utils.auth import get_password_hash
+from app.utils.demographics import age_bucket
+from app.utils.archive import click_archive
+from app.utils.rollup import rebuild_rollup
+from app.utils.uniques import rebuild_sketches
+from app.utils.partitions import (
+    add_months,
+    ensure_partitions,
+    month_range,
+    month_start,
+    partitions_enabled,
+)
 
 # Dummy data
 USERNAMES = [
@@ -39,82 +64,243 @@ USERNAMES = [
     "tina_turner",
 ]
 
-FEATURE_NAMES = [
-    "date_filter",
-    "age_filter",
-    "gender_filter",
-    "bar_chart_click",
-    "line_chart_click",
-    "export_data",
-    "refresh_button",
-]
+# Feature name -> relative popularity
+FEATURE_WEIGHTS = {
+    "date_filter": 22,
+    "age_filter": 12,
+    "gender_filter": 10,
+    "bar_chart_click": 25,
+    "line_chart_click": 15,
+    "export_data": 3,
+    "refresh_button": 13,
+}
+FEATURE_NAMES = list(FEATURE_WEIGHTS)
 
 GENDERS = ["Male", "Female", "Other"]
+GENDER_WEIGHTS = [48, 48, 4]
+
+# Activity by UTC hour: quiet at night, peak in the afternoon
+HOUR_WEIGHTS = [0.15 + max(0.0, math.sin(math.pi * (h - 6) / 16)) for h in range(24)]
+WEEKEND_FACTOR = 0.6
+# Zipf exponent for clicks per user (a few users click a lot)
+USER_SKEW = 1.1
+
+USER_COLUMNS = ["id", "email", "username", "password", "age", "gender", "created_at"]
+CLICK_COLUMNS = ["id", "user_id", "timestamp", "feature_id", "age_bucket", "gender"]
+
+
+async def load_rows(table, columns, rows) -> None:
+    """Bulk load tuples: COPY on PostgreSQL, one multi-row INSERT otherwise."""
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                table.name, records=rows, columns=columns
+            )
+        else:
+            await conn.execute(
+                insert(table), [dict(zip(columns, row)) for row in rows]
+            )
+
+
+async def drop_click_constraints() -> list:
+    """PostgreSQL: drop feature_clicks foreign keys and secondary indexes so
+    COPY only appends; returns the foreign keys for restore_click_constraints."""
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            return []
+        result = await conn.execute(
+            text(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+            ),
+            {"table": FeatureClick.__tablename__},
+        )
+        foreign_keys = result.all()
+        for name, _ in foreign_keys:
+            await conn.execute(
+                text(f'ALTER TABLE {FeatureClick.__tablename__} DROP CONSTRAINT "{name}"')
+            )
+        for index in FeatureClick.__table__.indexes:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    return foreign_keys
+
+
+async def restore_click_constraints(foreign_keys: list) -> None:
+    """Rebuild indexes in one sorted pass and re-validate foreign keys once."""
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            return
+
+        def create_indexes(sync_conn):
+            for index in FeatureClick.__table__.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+        await conn.run_sync(create_indexes)
+        for name, definition in foreign_keys:
+            await conn.execute(
+                text(
+                    f"ALTER TABLE {FeatureClick.__tablename__} "
+                    f'ADD CONSTRAINT "{name}" {definition}'
+                )
+            )
 
 
-async def reset_and_seed():
+def user_rows(count: int, rng: random.Random):
+    password = get_password_hash("password123")  # same for everyone, hash once
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        username = USERNAMES[i] if i < len(USERNAMES) else f"user_{i + 1:07d}"
+        rows.append(
+            (
+                str(uuid.uuid4()),
+                f"{username}@example.com",
+                username,
+                password,
+                min(60, max(15, round(rng.triangular(15, 60, 28)))),
+                rng.choices(GENDERS, GENDER_WEIGHTS)[0],
+                now,
+            )
+        )
+    return rows
+
+
+class ClickGenerator:
+    """Draws synthetic clicks batch by batch (constant memory)."""
+
+    def __init__(self, users, feature_ids, days: int, rng: random.Random):
+        self.rng = rng
+        self.now = datetime.now(timezone.utc)
+        # user id -> (age bucket, gender), stored on every click
+        self.demographics = {
+            row[0]: (age_bucket(row[4]), row[5]) for row in users
+        }
+
+        # Skewed users, shuffled so activity is not tied to creation order
+        self.user_ids = list(self.demographics)
+        rng.shuffle(self.user_ids)
+        self.user_cum = self._cumulative(
+            [1 / (rank + 1) ** USER_SKEW for rank in range(len(self.user_ids))]
+        )
+
+        self.feature_ids = [feature_ids[name] for name in FEATURE_NAMES]
+        self.feature_cum = self._cumulative([FEATURE_WEIGHTS[n] for n in FEATURE_NAMES])
+
+        # Day starts with weekend dip and gentle growth towards today
+        first_day = (self.now - timedelta(days=days)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.day_starts = [first_day + timedelta(days=d) for d in range(days + 1)]
+        self.day_cum = self._cumulative(
+            [
+                (WEEKEND_FACTOR if day.weekday() >= 5 else 1.0)
+                * (0.7 + 0.3 * index / max(1, days))
+                for index, day in enumerate(self.day_starts)
+            ]
+        )
+        self.hour_cum = self._cumulative(HOUR_WEIGHTS)
+
+    @staticmethod
+    def _cumulative(weights):
+        return list(itertools.accumulate(weights))
+
+    def batch(self, size: int):
+        rng = self.rng
+        users = rng.choices(self.user_ids, cum_weights=self.user_cum, k=size)
+        features = rng.choices(self.feature_ids, cum_weights=self.feature_cum, k=size)
+        days = rng.choices(self.day_starts, cum_weights=self.day_cum, k=size)
+        hours = rng.choices(range(24), cum_weights=self.hour_cum, k=size)
+        return [
+            (
+                str(uuid.uuid4()),
+                user_id,
+                min(self.now, day + timedelta(hours=hour, seconds=rng.random() * 3600)),
+                feature_id,
+                *self.demographics[user_id],
+            )
+            for user_id, feature_id, day, hour in zip(users, features, days, hours)
+        ]
+
+
+async def reset_and_seed(
+    users: int, clicks: int, days: int, batch_size: int, seed: int | None
+):
     print("🔄 Starting Full Reset & Seed Process...")
+    rng = random.Random(seed)
 
     # 1. Reset Database Structure
     print("\n🗑️  Step 1: Resetting Tables...")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         print("   ✅ Tables dropped")
+        if click_archive.clear():
+            print(f"   ✅ Click archive in {click_archive.root}/ removed")
         await conn.run_sync(Base.metadata.create_all)
         print("   ✅ Tables recreated")
+        if partitions_enabled(conn):
+            this_month = month_start(datetime.now(timezone.utc).date())
+            first_month = month_start(
+                datetime.now(timezone.utc).date() - timedelta(days=days)
+            )
+            await ensure_partitions(
+                conn, month_range(first_month, add_months(this_month, 3))
+            )
+            print("   ✅ Click partitions created")
 
     # 2. Seed Data
     print("\n🌱 Step 2: Seeding Data...")
-    async with AsyncSessionLocal() as db:
-
-        # Create Users
-        print("   👤 Creating 20 users...")
-        users = []
-        for username in USERNAMES:
-            user = User(
-                id=str(uuid.uuid4()),
-                username=username,
-                email=f"{username}@example.com",
-                password=get_password_hash("password123"),
-                age=random.randint(15, 60),
-                gender=random.choice(GENDERS),
-            )
-            db.add(user)
-            users.append(user)
-
-        await db.commit()
-
-        # Refresh users to get UUIDs
-        for user in users:
-            await db.refresh(user)
-        print(f"   ✅ Created {len(users)} users")
-
-        # Create Clicks
-        print("   📊 Creating 150 clicks...")
-        clicks = []
-        end_date = datetime.now(timezone.utc)
-        start_date = end_date - timedelta(days=30)
-
-        for _ in range(150):
-            user = random.choice(users)
-            feature = random.choice(FEATURE_NAMES)
-
-            # Random time
-            random_days = random.randint(0, 30)
-            random_hours = random.randint(0, 23)
-            click_time = start_date + timedelta(days=random_days, hours=random_hours)
-
-            click = FeatureClick(
-                id=str(uuid.uuid4()),  # EXPLICIT STRING ID
-                user_id=user.id,
-                feature_name=feature,
-                timestamp=click_time,
+
+    # Create Users
+    print(f"   👤 Creating {users} users...")
+    rows = user_rows(users, rng)
+    for start in range(0, len(rows), batch_size):
+        await load_rows(User.__table__, USER_COLUMNS, rows[start : start + batch_size])
+    user_ids = [row[0] for row in rows]
+    print(f"   ✅ Created {len(user_ids)} users")
+
+    # Create Features (clicks reference them by id)
+    async with engine.begin() as conn:
+        await conn.execute(insert(Feature), [{"name": name} for name in FEATURE_NAMES])
+        result = await conn.execute(select(Feature.name, Feature.id))
+        feature_ids = dict(result.all())
+    print(f"   ✅ Created {len(feature_ids)} features")
+
+    # Create Clicks
+    print(f"   📊 Creating {clicks} clicks over {days} days...")
+    generator = ClickGenerator(rows, feature_ids, days, rng)
+    started = time.perf_counter()
+    foreign_keys = await drop_click_constraints()
+    loaded = 0
+    while loaded < clicks:
+        batch = generator.batch(min(batch_size, clicks - loaded))
+        await load_rows(FeatureClick.__table__, CLICK_COLUMNS, batch)
+        loaded += len(batch)
+        if clicks > batch_size:
+            elapsed = time.perf_counter() - started
+            print(
+                f"      {loaded:>12,} / {clicks:,} clicks "
+                f"({loaded / elapsed:,.0f} rows/sec)",
+                flush=True,
             )
-            db.add(click)
-            clicks.append(click)
+    if foreign_keys:
+        print("      🗂️  Rebuilding indexes and foreign keys...", flush=True)
+    await restore_click_constraints(foreign_keys)
+    elapsed = time.perf_counter() - started
+    print(
+        f"   ✅ Created {loaded} clicks in {elapsed:.1f}s "
+        f"({loaded / max(elapsed, 1e-9):,.0f} rows/sec)"
+    )
 
-        await db.commit()
-        print(f"   ✅ Created {len(clicks)} clicks")
+    # 3. Rebuild daily rollup and unique-user sketches for the analytics endpoint
+    print("\n📊 Step 3: Building daily rollup and unique-user sketches...")
+    async with engine.begin() as conn:
+        rollup_rows = await rebuild_rollup(conn)
+        sketches = await rebuild_sketches(conn)
+        if conn.dialect.name == "postgresql":
+            # Fresh planner statistics for the benchmark queries
+            await conn.exec_driver_sql("ANALYZE")
+    print(f"   ✅ {rollup_rows} rollup rows, {sketches} sketches")
 
     print("\n" + "=" * 50)
     print("🎉 SUCCESS! Database is fresh and populated!")
@@ -122,6 +308,18 @@ async def reset_and_seed():
     print("👉 Now RESTART your server (python main.py)")
     print("   to pick up the new database state.")
 
+    # Close pooled connections (aiosqlite threads would keep the process alive)
+    await engine.dispose()
+
 
 if __name__ == "__main__":
-    asyncio.run(reset_and_seed())
+    parser = argparse.ArgumentParser(description="Reset the database and seed it")
+    parser.add_argument("--users", type=int, default=len(USERNAMES))
+    parser.add_argument("--clicks", type=int, default=150)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, help="random seed for repeatable data")
+    args = parser.parse_args()
+    asyncio.run(
+        reset_and_seed(args.users, args.clicks, args.days, args.batch_size, args.seed)
+    )
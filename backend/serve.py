@@ -0,0 +1,59 @@
+"""
+Production server: several uvicorn workers, no auto-reload.
+
+Usage:
+    python manage.py create-schema   # once per deploy, before starting workers
+    python serve.py                  # $WEB_CONCURRENCY workers (default: CPU count) on $PORT
+    python serve.py --workers 4 --port 9000
+
+Workers skip schema setup on startup (SCHEMA_ON_STARTUP=false unless set)
+and spread their first hot tier load over HOT_TIER_START_SPREAD_S (30s unless
+set). Partition maintenance runs in one worker at a time (advisory lock).
+uvicorn spawns each worker as a fresh interpreter and this launcher never
+imports the app, so engines, pools and background tasks are created inside
+the workers, never inherited. Uses uvloop and httptools when installed.
+"""
+
+import argparse
+import importlib.util
+import os
+import time
+import uvicorn
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with several workers")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "9000")))
+    args = parser.parse_args()
+
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+
+    # Inherited by the workers
+    os.environ.setdefault("SCHEMA_ON_STARTUP", "false")
+    if args.workers > 1:
+        os.environ.setdefault("HOT_TIER_START_SPREAD_S", "30")
+    os.environ["APP_LAUNCHED_AT"] = str(time.time())
+
+    print(
+        f"🚀 Starting {args.workers} worker(s) on {args.host}:{args.port} "
+        f"(loop={loop}, http={http})"
+    )
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+    )
@@ -3,3 +3,6 @@ export const GENDER_OPTIONS = ["Male", "Female", "Other"];
 export const COOKIE_KEYS = {
   DASHBOARD_FILTERS: "dashboardFilters",
 };
+
+// Queued click events are sent to /track/batch at this interval
+export const CLICK_FLUSH_INTERVAL_MS = 3000;
@@ -1,8 +1,29 @@
 import { useState, useEffect, useMemo, useRef, useCallback } from "react";
 import { useCookies } from "react-cookie";
 import axiosInstance from "../api/axios";
-import type { DashboardFilters, AnalyticsData, LineDataItem, RawLineDataItem } from "../types/dashboard";
-import { COOKIE_KEYS } from "../constants";
+import type { DashboardFilters, AnalyticsData, LineDataItem, RawLineDataItem, ClickEvent, ClickDelta } from "../types/dashboard";
+import { COOKIE_KEYS, CLICK_FLUSH_INTERVAL_MS } from "../constants";
+
+// Line chart bucket size for a date range (fewer points for long ranges)
+const pickGranularity = (startDate: string, endDate: string) => {
+  const days =
+    (new Date(endDate).getTime() - new Date(startDate).getTime()) / 86_400_000;
+  if (days > 366) return "month";
+  if (days > 92) return "week";
+  return "day";
+};
+
+// Line chart label of the bucket a day falls into (null: not placeable)
+const bucketLabel = (day: string, granularity: string) => {
+  if (granularity === "day") return day;
+  if (granularity === "month") return `${day.slice(0, 7)}-01`;
+  if (granularity === "week") {
+    const date = new Date(`${day}T00:00:00Z`);
+    date.setUTCDate(date.getUTCDate() - ((date.getUTCDay() + 6) % 7)); // Monday
+    return date.toISOString().split("T")[0];
+  }
+  return null;
+};
 
 export const useAnalytics = () => {
   const [cookies, setCookie] = useCookies([COOKIE_KEYS.DASHBOARD_FILTERS]);
@@ -31,6 +52,21 @@ export const useAnalytics = () => {
   const [data, setData] = useState<AnalyticsData>({ barData: [], lineData: [] });
   const [selectedFeature, setSelectedFeature] = useState<string | null>(null);
 
+  // Clicks are queued locally and flushed to /track/batch in one request
+  const clickQueue = useRef<ClickEvent[]>([]);
+
+  // Live feed state: stream open, and own clicks already counted optimistically
+  // (their deltas come back through the stream and must not count twice)
+  const liveRef = useRef(false);
+  const optimisticClicks = useRef<Record<string, number>>({});
+
+  const queueClick = useCallback((featureName: string) => {
+    clickQueue.current.push({
+      feature_name: featureName,
+      timestamp: new Date().toISOString(),
+    });
+  }, []);
+
   // Data fetch logic extracted for reuse (The Elite Way)
   const fetchAnalytics = useCallback(async (isTracking = false, ensureToday = false) => {
     // Clean filters
@@ -51,27 +87,164 @@ export const useAnalytics = () => {
        }
     }
 
-    // CACHE BUSTER: Add timestamp to prevent browser caching of GET requests
-    // This is crucial for verifying "Read-After-Write" 
-    const finalParams = { ...params, _t: Date.now() };
+    // Long ranges ask the server for pre-bucketed points
+    params.granularity = pickGranularity(params.startDate, params.endDate);
 
+    // No cache buster: the server answers with an ETag and "no-cache", so the
+    // browser revalidates every time and unchanged data comes back as a 304
     try {
-      const res = await axiosInstance.get("/track/analytics", {
-        params: finalParams,
-      });
+      const res = await axiosInstance.get("/track/analytics", { params });
 
-      setData({ barData: res.data.bar_data, lineData: res.data.line_data });
+      setData({
+        barData: res.data.bar_data,
+        lineData: res.data.line_data,
+        uniqueUsers: res.data.unique_users,
+      });
+      optimisticClicks.current = {};
 
       // Track filter change (only if specified and not skipped)
       if (isTracking) {
-         await axiosInstance.post("/track/", { feature_name: "Filter Interaction" });
+         queueClick("Filter Interaction");
       }
 
     } catch (err) {
-      console.error("Failed to fetch analytics or track", err);
+      console.error("Failed to fetch analytics", err);
     }
+  }, [filters, firstDay, lastDay, queueClick]);
+
+  // Keep the latest fetcher for the flush timer without restarting it
+  const fetchRef = useRef(fetchAnalytics);
+  useEffect(() => {
+    fetchRef.current = fetchAnalytics;
+  }, [fetchAnalytics]);
+
+  // Apply click count deltas pushed by /track/stream
+  const applyDeltas = useCallback((deltas: ClickDelta[]) => {
+    const startDate = filters.startDate || firstDay;
+    const endDate = filters.endDate || lastDay;
+    const granularity = pickGranularity(startDate, endDate);
+    const todayUtc = new Date().toISOString().split("T")[0];
+
+    const barIncrements: Record<string, number> = {};
+    const lineIncrements: Record<string, number> = {};
+    deltas.forEach(({ feature, day, clicks }) => {
+      if (day < startDate || day > endDate) return;
+
+      let barClicks = clicks;
+      const optimistic = optimisticClicks.current[feature] || 0;
+      if (optimistic && day === todayUtc) {
+        const absorbed = Math.min(optimistic, clicks);
+        optimisticClicks.current[feature] = optimistic - absorbed;
+        barClicks -= absorbed;
+      }
+      barIncrements[feature] = (barIncrements[feature] || 0) + barClicks;
+
+      const label = bucketLabel(day, granularity);
+      if (label) {
+        const key = `${label}|${feature}`;
+        lineIncrements[key] = (lineIncrements[key] || 0) + clicks;
+      }
+    });
+
+    setData((prev) => {
+      const barData = prev.barData.map((item) =>
+        item.feature in barIncrements
+          ? { ...item, clicks: item.clicks + barIncrements[item.feature] }
+          : item
+      );
+      Object.keys(barIncrements).forEach((feature) => {
+        if (!prev.barData.some((item) => item.feature === feature)) {
+          barData.push({ feature, clicks: barIncrements[feature] });
+        }
+      });
+
+      const lineData = prev.lineData.map((item) => {
+        const key = `${item.date}|${item.feature}`;
+        if (!(key in lineIncrements)) return item;
+        const clicks = item.clicks + lineIncrements[key];
+        delete lineIncrements[key];
+        return { ...item, clicks };
+      });
+      Object.keys(lineIncrements).forEach((key) => {
+        const [date, feature] = key.split("|");
+        lineData.push({ date, feature, clicks: lineIncrements[key] });
+      });
+
+      // Deltas carry click counts only; unique users refresh on the next fetch
+      return { ...prev, barData, lineData };
+    });
   }, [filters, firstDay, lastDay]);
 
+  const applyDeltasRef = useRef(applyDeltas);
+  useEffect(() => {
+    applyDeltasRef.current = applyDeltas;
+  }, [applyDeltas]);
+
+  // Live feed: counts from every dashboard's clicks, no re-querying
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    if (!token || typeof EventSource === "undefined") return;
+
+    // EventSource cannot send headers, the token goes in the query string
+    const params = new URLSearchParams({ token });
+    if (filters.ageGroup) params.set("ageGroup", filters.ageGroup);
+    if (filters.gender) params.set("gender", filters.gender);
+    const source = new EventSource(
+      `${import.meta.env.VITE_API_URL}/track/stream?${params}`
+    );
+
+    let reconnecting = false;
+    source.onopen = () => {
+      liveRef.current = true;
+      // Deltas sent while we were disconnected are lost: catch up once
+      if (reconnecting) fetchRef.current(false);
+      reconnecting = true;
+    };
+    source.onerror = () => {
+      liveRef.current = false;
+    };
+    source.addEventListener("clicks", (event) => {
+      applyDeltasRef.current(JSON.parse((event as MessageEvent).data).deltas);
+    });
+    // Server dropped deltas for this stream
+    source.addEventListener("reset", () => fetchRef.current(false));
+
+    return () => {
+      source.close();
+      liveRef.current = false;
+    };
+  }, [filters.ageGroup, filters.gender]);
+
+  // Flush queued clicks every few seconds; without the live feed, re-fetch
+  useEffect(() => {
+    const flushClicks = async () => {
+      if (clickQueue.current.length === 0) return;
+      const events = clickQueue.current;
+      clickQueue.current = [];
+
+      try {
+        await axiosInstance.post("/track/batch", { events });
+      } catch (err) {
+        console.error("Tracking batch failed", err);
+        // Put the events back so the next flush retries them
+        clickQueue.current = [...events, ...clickQueue.current];
+        return;
+      }
+
+      // The live feed delivers the new counts; otherwise re-fetch.
+      // SMART FETCH: Ensure we fetch up to TODAY so the new DB records are included!
+      if (!liveRef.current) {
+        await fetchRef.current(false, true);
+      }
+    };
+
+    const interval = setInterval(flushClicks, CLICK_FLUSH_INTERVAL_MS);
+    return () => {
+      clearInterval(interval);
+      flushClicks();
+    };
+  }, []);
+
 
   // Effect for Filters (Debounced)
   const isFirstRun = useRef(true);
@@ -93,60 +266,34 @@ export const useAnalytics = () => {
     return () => clearTimeout(timer);
   }, [filters, fetchAnalytics, setCookie]);
 
-  // Throttling helper for clicks
-  const throttleTimeout = useRef<unknown>(null);
-
-  const handleBarClick = async (payload: any) => {
+  const handleBarClick = (payload: any) => {
     if (!payload || !payload.feature) return;
 
     const featureName = payload.feature;
     // 1. Immediate UI Update
     setSelectedFeature(featureName);
 
-    // 2. Throttled Backend Call & Re-fetch
-    if (!throttleTimeout.current) {
-      // Set lock immediately
-      throttleTimeout.current = setTimeout(() => {
-        throttleTimeout.current = null;
-      }, 2000);
-
-      // SMART OPTIMISTIC LOGIC:
-      // If demographic filters (Age/Gender) are active, we CANNOT guarantee the user matches them.
-      // So we DISABLE optimistic updates to prevent "Revert/Flicker" (User Request).
-      const hasDemographics = filters.ageGroup || filters.gender;
-
-      if (!hasDemographics) {
-        // Safe to update optimistically
-        setData((prev) => {
-          const newBarData = prev.barData.map((item) =>
-            item.feature === featureName
-              ? { ...item, clicks: item.clicks + 1 }
-              : item
-          );
-          return { ...prev, barData: newBarData };
-        });
-      } else {
-        // console.log("Optimistic update skipped due to active demographic filters (Safe Mode).");
-      }
+    // SMART OPTIMISTIC LOGIC:
+    // If demographic filters (Age/Gender) are active, we CANNOT guarantee the user matches them.
+    // So we DISABLE optimistic updates to prevent "Revert/Flicker" (User Request).
+    const hasDemographics = filters.ageGroup || filters.gender;
 
-      try {
-        await axiosInstance.post("/track/", { feature_name: featureName });
-        
-        // Increased delay to ensure AWS/Cloud DB consistency (500ms)
-        await new Promise(resolve => setTimeout(resolve, 500));
-
-        // Re-fetch data to ensure server sync
-        
-        // SMART FETCH: Ensure we fetch up to TODAY so the new DB record is included!
-        await fetchAnalytics(false, true); 
-        
-      } catch (err) {
-        console.error("Tracking call failed", err);
-        // Rollback could be implemented here if needed, but for analytics it's usually fine
-      }
-    } else {
-      // console.log(`Tracking throttled for: ${featureName}`);
+    if (!hasDemographics) {
+      // Safe to update optimistically
+      setData((prev) => {
+        const newBarData = prev.barData.map((item) =>
+          item.feature === featureName
+            ? { ...item, clicks: item.clicks + 1 }
+            : item
+        );
+        return { ...prev, barData: newBarData };
+      });
+      optimisticClicks.current[featureName] =
+        (optimisticClicks.current[featureName] || 0) + 1;
     }
+
+    // 2. Queue for the next batch flush (server sync happens after the flush)
+    queueClick(featureName);
   };
 
   // Derived state for Line Chart - Memoized for performance
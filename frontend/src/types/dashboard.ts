@@ -21,9 +21,40 @@ export interface RawLineDataItem {
   clicks: number;
 }
 
+export interface ClickEvent {
+  feature_name: string;
+  timestamp: string;
+}
+
+// One coalesced count update from /track/stream
+export interface ClickDelta {
+  feature: string;
+  day: string;
+  clicks: number;
+}
+
+// Distinct users, approximate (HyperLogLog) unless `exact`; margin is ~95%
+export interface UniqueUsersItem {
+  feature: string;
+  users: number;
+  margin: number;
+}
+
+export interface UniqueUsersSeriesItem extends UniqueUsersItem {
+  date: string;
+}
+
+export interface UniqueUsers {
+  exact: boolean;
+  relative_error: number;
+  totals: UniqueUsersItem[];
+  series: UniqueUsersSeriesItem[];
+}
+
 export interface AnalyticsData {
   barData: BarDataItem[];
   lineData: RawLineDataItem[];
+  uniqueUsers?: UniqueUsers;
 }
 
 export interface DateFiltersProps {